@@ -0,0 +1,155 @@
+"""Measures how many card plays per second simulate_card_play does on a mix of starter and rare cards.
+
+The if-chain simulate_card_play the effect programs of spirecomm.ai.card_effects replaced is gone, its figures were recorded
+with this script on the commit before them and are printed next to the measure. They were taken on another machine than
+yours maybe, only a measure of both on the same machine compares them exactly.
+
+Run from the root of the repository:
+    python benchmarks/card_effects_benchmark.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spirecomm.ai.agent import SimpleAgent
+from spirecomm.spire.game import Game
+from spirecomm.spire.undo import UndoLog
+
+STARTER_CARDS = ["Strike", "Strike+", "Defend", "Defend+", "Bash"]
+RARE_CARDS = [
+    "Bludgeon",
+    "Demon Form",
+    "Impervious",
+    "Fiend Fire",
+    "Offering",
+    "Reaper",
+    "Immolate",
+    "Limit Break",
+    "Whirlwind",
+    "Uppercut",
+]
+SKILL_CARDS = ["Defend", "Impervious", "Offering", "Limit Break"]
+CARD_IDS = {"Strike": "Strike_R", "Defend": "Defend_R"}
+TARGETED_CARDS = ["Strike", "Bash", "Bludgeon", "Fiend Fire", "Uppercut"]
+PLAYS_PER_CARD = 2000
+# The machine is noisy, the best of these runs is reported
+REPEATS = 5
+
+# Plays/sec of the if-chain simulate_card_play, and of the first effect programs, best of five runs of this script
+IF_CHAIN_PLAYS_PER_SECOND = {"starter": 94000, "rare": 48000, "mix": 51000}
+EFFECT_PROGRAMS_PLAYS_PER_SECOND = {"starter": 123000, "rare": 52000, "mix": 57000}
+
+
+def card_json(name, index):
+    base_name = name.rstrip("+")
+    return {
+        "id": CARD_IDS.get(base_name, base_name),
+        "name": name,
+        "type": "SKILL" if base_name in SKILL_CARDS else "ATTACK",
+        "rarity": "COMMON",
+        "upgrades": 1 if name.endswith("+") else 0,
+        "has_target": base_name in TARGETED_CARDS,
+        "cost": 1,
+        "uuid": f"benchmark-{index}",
+        "is_playable": True,
+    }
+
+
+def monster_json(name, monster_id, hp, damage):
+    return {
+        "name": name,
+        "id": monster_id,
+        "max_hp": hp,
+        "current_hp": hp,
+        "block": 0,
+        "intent": "ATTACK",
+        "half_dead": False,
+        "is_gone": False,
+        "move_adjusted_damage": damage,
+        "move_base_damage": damage,
+        "move_hits": 1,
+        "powers": [],
+    }
+
+
+def build_game(card_names):
+    hand = [card_json(name, i) for i, name in enumerate(card_names)]
+    draw_pile = [card_json("Strike", 100 + i) for i in range(5)]
+    game_state = {
+        "current_hp": 60,
+        "max_hp": 80,
+        "floor": 10,
+        "act": 1,
+        "gold": 99,
+        "seed": 1,
+        "class": "IRONCLAD",
+        "ascension_level": 0,
+        "relics": [{"id": "Burning Blood", "name": "Burning Blood", "counter": -1}],
+        "deck": hand + draw_pile,
+        "potions": [],
+        "map": [],
+        "screen_type": "NONE",
+        "screen_state": {},
+        "room_phase": "COMBAT",
+        "room_type": "MonsterRoom",
+        "combat_state": {
+            "player": {
+                "max_hp": 80,
+                "current_hp": 60,
+                "block": 0,
+                "energy": 3,
+                "powers": [{"id": "Strength", "name": "Strength", "amount": 2}],
+            },
+            "monsters": [
+                monster_json("Jaw Worm", "JawWorm", 42, 11),
+                monster_json("Cultist", "Cultist", 50, 6),
+            ],
+            "hand": hand,
+            "draw_pile": draw_pile,
+            "discard_pile": [],
+            "exhaust_pile": [],
+            "limbo": [],
+            "turn": 1,
+            "cards_discarded_this_turn": 0,
+        },
+    }
+    return Game.from_json(game_state, ["play", "end"])
+
+
+def plays_per_second(card_names):
+    agent = SimpleAgent()
+    agent.game = build_game(card_names)
+    # The search plays the cards on games whose sections are all built, see LazyGame
+    agent.game.load_sections()
+    cards = list(agent.game.hand)
+
+    best = float("inf")
+    with UndoLog() as undo_log:
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            for card in cards:
+                target = agent.get_best_target(agent.game) if card.has_target else None
+                for _ in range(PLAYS_PER_CARD):
+                    mark = undo_log.mark()
+                    agent.simulate_card_play(agent.game, card, target)
+                    undo_log.undo(mark)
+            best = min(best, time.perf_counter() - start)
+
+    return len(cards) * PLAYS_PER_CARD / best
+
+
+if __name__ == "__main__":
+    for label, card_names in [
+        ("starter", STARTER_CARDS),
+        ("rare", RARE_CARDS),
+        ("mix", STARTER_CARDS + RARE_CARDS),
+    ]:
+        plays = plays_per_second(card_names)
+        before = IF_CHAIN_PLAYS_PER_SECOND[label]
+        after = EFFECT_PROGRAMS_PLAYS_PER_SECOND[label]
+        print(
+            f"{label:>8}: {plays:10.0f} plays/sec, recorded: if-chain {before} -> effect programs {after}"
+        )
@@ -0,0 +1,46 @@
+"""Measures copies and card plays per second of CombatArrays against clone_for_simulation and simulate_card_play, on the game of
+models_benchmark.
+
+Run from the root of the repository:
+    python benchmarks/combat_arrays_benchmark.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models_benchmark import build_game
+from spirecomm.ai.agent import SimpleAgent
+from spirecomm.ai.combat_arrays import CombatArrays, play_card
+
+COPIES = 20000
+PLAYS = 5000
+
+
+def per_second(function, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        function()
+    return count / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    game = build_game()
+    arrays = CombatArrays.from_game(game)
+    agent = SimpleAgent()
+    card = next(card for card in game.hand if card.card_id == "Strike_R")
+    target = game.monsters[0]
+
+    def simulate():
+        agent.simulate_card_play(game.clone_for_simulation(), card, target)
+
+    def play():
+        play_card(arrays.copy(), card, target)
+
+    print(f"CombatArrays: {arrays.data.nbytes} bytes")
+    print(f"clone_for_simulation: {per_second(game.clone_for_simulation, COPIES):10.0f} copies/sec")
+    print(f"CombatArrays.copy: {per_second(arrays.copy, COPIES):10.0f} copies/sec")
+    print(f"simulate_card_play: {per_second(simulate, PLAYS):10.0f} plays/sec")
+    print(f"play_card: {per_second(play, PLAYS):10.0f} plays/sec")
@@ -0,0 +1,66 @@
+"""Measures the throughput of the stdin reader of the coordinator on the messages of checks/combat_states.jsonl, against the
+character by character loop it replaced.
+
+Run from the root of the repository:
+    python benchmarks/communication_benchmark.py
+"""
+
+import io
+import os
+import queue
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spirecomm.communication.coordinator import read_stdin
+
+TRANSCRIPT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "checks",
+    "combat_states.jsonl",
+)
+REPEATS = 20
+
+
+def load_transcript():
+    with open(TRANSCRIPT, "rb") as transcript:
+        return transcript.read() * REPEATS
+
+
+def read_characters(input_queue, file_path, input_stream):
+    """The reader before the buffered one, input_stream is a text stream like sys.stdin"""
+    with open(file_path, "a") as file:
+        while True:
+            stdin_input = ""
+            while True:
+                input_char = input_stream.read(1)
+                if input_char == "\n" or input_char == "":
+                    break
+                else:
+                    stdin_input += input_char
+            if input_char == "":
+                return
+            input_queue.put(stdin_input)
+            file.write(stdin_input + "\n")
+
+
+def megabytes_per_second(reader, input_stream, size):
+    input_queue = queue.Queue()
+    start = time.perf_counter()
+    reader(input_queue, os.devnull, input_stream)
+    elapsed = time.perf_counter() - start
+    return size / elapsed / 1e6, input_queue.qsize()
+
+
+if __name__ == "__main__":
+    transcript = load_transcript()
+    size = len(transcript)
+    print(f"transcript: {size / 1e6:.1f} MB")
+
+    stdin = io.TextIOWrapper(io.BytesIO(transcript), encoding="utf-8")
+    speed, messages = megabytes_per_second(read_characters, stdin, size)
+    print(f"read(1) loop: {speed:8.1f} MB/s, {messages} messages")
+
+    speed, messages = megabytes_per_second(read_stdin, io.BytesIO(transcript), size)
+    print(f"buffered readline: {speed:8.1f} MB/s, {messages} messages")
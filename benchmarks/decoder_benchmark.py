@@ -0,0 +1,67 @@
+"""Measures the time to decode a message of checks/combat_states.jsonl with every installed JSON backend of the coordinator,
+from the bytes the reader gives and, for the standard library, from the text the reader used to give. Every backend has to
+decode the messages to the same objects as the json module.
+
+Run from the root of the repository:
+    python benchmarks/decoder_benchmark.py
+"""
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spirecomm.communication import decoder
+
+TRANSCRIPT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "checks",
+    "combat_states.jsonl",
+)
+REPEATS = 5
+
+
+def load_messages():
+    with open(TRANSCRIPT, "rb") as transcript:
+        return [line.rstrip(b"\r\n") for line in transcript if line.strip()]
+
+
+def microseconds_per_message(decode, messages):
+    """The best of REPEATS passes over the messages"""
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        for message in messages:
+            decode(message)
+        best = min(best, time.perf_counter() - start)
+    return best / len(messages) * 1e6
+
+
+def decode_text(message):
+    """The decoding before the bytes were passed on: to text, then json.loads"""
+    return json.loads(message.decode("utf-8"))
+
+
+if __name__ == "__main__":
+    messages = load_messages()
+    size = sum(len(message) for message in messages)
+    print(f"{len(messages)} messages, {size / len(messages) / 1e3:.1f} kB on average")
+    print(f"default backend: {decoder.backend}")
+
+    expected = [json.loads(message) for message in messages]
+    timings = [("json from text", decode_text)]
+    for name in decoder.backends:
+        try:
+            decode = decoder.get_decoder(name)
+        except ImportError:
+            print(f"{name}: not installed")
+            continue
+        if [decode(message) for message in messages] != expected:
+            print(f"{name}: decodes differently from json")
+            sys.exit(1)
+        timings.append((name, decode))
+
+    for name, decode in timings:
+        print(f"{name}: {microseconds_per_message(decode, messages):10.1f} us/message")
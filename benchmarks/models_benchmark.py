@@ -0,0 +1,120 @@
+"""Measures the time of copy.deepcopy(Game) and of Game.clone_for_simulation, and the peak memory of one expectimax decision.
+
+Run from the root of the repository:
+    python benchmarks/models_benchmark.py
+"""
+
+import copy
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from card_effects_benchmark import card_json, monster_json
+from spirecomm.ai.agent import SimpleAgent
+from spirecomm.spire.game import Game
+
+HAND = ["Strike", "Strike", "Strike+", "Defend", "Defend+", "Bash", "Uppercut", "Shrug It Off"]
+DECK = HAND + ["Strike", "Defend", "Pommel Strike", "Twin Strike", "Inflame"] * 4
+COPIES = 2000
+
+
+def map_json(floors=15, width=7):
+    nodes = []
+    for y in range(floors):
+        for x in range(width):
+            children = [] if y == floors - 1 else [{"x": x, "y": y + 1}]
+            nodes.append({"x": x, "y": y, "symbol": "M", "children": children})
+    return nodes
+
+
+def build_game():
+    deck = [card_json(name, i) for i, name in enumerate(DECK)]
+    hand = deck[: len(HAND)]
+    monster = monster_json("Jaw Worm", "JawWorm", 42, 11)
+    monster["powers"] = [{"id": "Strength", "name": "Strength", "amount": 3}]
+    game_state = {
+        "current_hp": 60,
+        "max_hp": 80,
+        "floor": 10,
+        "act": 1,
+        "gold": 99,
+        "seed": 1,
+        "class": "IRONCLAD",
+        "ascension_level": 0,
+        "relics": [
+            {"id": relic, "name": relic, "counter": -1}
+            for relic in ["Burning Blood", "Anchor", "Vajra", "Orichalcum", "Akabeko"]
+        ],
+        "deck": deck,
+        "potions": [
+            {"id": "Potion Slot", "name": "Potion Slot"},
+            {"id": "Fire Potion", "name": "Fire Potion", "can_use": True},
+            {"id": "Block Potion", "name": "Block Potion", "can_use": True},
+        ],
+        "map": map_json(),
+        "screen_type": "NONE",
+        "screen_state": {},
+        "room_phase": "COMBAT",
+        "room_type": "MonsterRoom",
+        "combat_state": {
+            "player": {
+                "max_hp": 80,
+                "current_hp": 60,
+                "block": 0,
+                "energy": 3,
+                "powers": [{"id": "Strength", "name": "Strength", "amount": 2}],
+            },
+            "monsters": [
+                monster,
+                monster_json("Cultist", "Cultist", 50, 6),
+                monster_json("Louse", "FuzzyLouseNormal", 15, 5),
+            ],
+            "hand": hand,
+            "draw_pile": deck[len(HAND) : len(HAND) + 15],
+            "discard_pile": deck[len(HAND) + 15 :],
+            "exhaust_pile": [],
+            "limbo": [],
+            "turn": 1,
+            "cards_discarded_this_turn": 0,
+        },
+    }
+    return Game.from_json(game_state, ["play", "end"])
+
+
+def deepcopies_per_second(game):
+    start = time.perf_counter()
+    for _ in range(COPIES):
+        copy.deepcopy(game)
+    return COPIES / (time.perf_counter() - start)
+
+
+def clones_per_second(game):
+    start = time.perf_counter()
+    for _ in range(COPIES):
+        game.clone_for_simulation()
+    return COPIES / (time.perf_counter() - start)
+
+
+def decision_peak_memory(game):
+    agent = SimpleAgent()
+    agent.parallel_search = False
+    agent.decision_time_limit = None
+    agent.game = game
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    agent.expectimax()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak, elapsed
+
+
+if __name__ == "__main__":
+    print(f"deepcopy(Game): {deepcopies_per_second(build_game()):8.0f} copies/sec")
+    print(f"clone_for_simulation: {clones_per_second(build_game()):8.0f} clones/sec")
+    peak, elapsed = decision_peak_memory(build_game())
+    print(f"decision: {peak / 1024:8.0f} KiB peak memory, {elapsed:.2f}s with tracemalloc on")
@@ -1,3 +1,6 @@
+from types import MappingProxyType
+
+
 ironclad_cards = {
     # Normal cards
     "Strike": {"type": "ATTACK", "damage": 6, "block": 0},
@@ -705,4 +708,83 @@ ironclad_relic_values = {
 
 
 def get_card_values(card_name):
-    return ironclad_cards.get(card_name, {})
\ No newline at end of file
+    return ironclad_cards.get(card_name, {})
+
+
+class CardSpec:
+    """The values of a card of the dictionary, resolved once when the card is parsed.
+    Specs are interned: every card with the same name shares one, so they are read-only. The values the simulation reads the most are typed fields,
+    the rest are in values
+    """
+
+    __slots__ = (
+        "name",
+        "values",
+        "type",
+        "damage",
+        "block",
+        "draw",
+        "gain_energy",
+        "lose_hp",
+        "strength",
+        "vulnerable",
+        "weak",
+        "multiple_hits",
+        "hits",
+        "strength_multiplier",
+        "exhaust",
+    )
+
+    def __init__(self, name, card_values):
+        set_field = object.__setattr__
+        set_field(self, "name", name)
+        set_field(self, "values", MappingProxyType(dict(card_values)))
+        set_field(self, "type", card_values.get("type"))
+        set_field(self, "damage", card_values.get("damage", 0))
+        set_field(self, "block", card_values.get("block", 0))
+        set_field(self, "draw", card_values.get("draw", 0))
+        set_field(self, "gain_energy", card_values.get("gain_energy", 0))
+        set_field(self, "lose_hp", card_values.get("lose_hp", 0))
+        set_field(self, "strength", card_values.get("strength", 0))
+        set_field(self, "vulnerable", card_values.get("vulnerable", 0))
+        set_field(self, "weak", card_values.get("weak", 0))
+        set_field(self, "multiple_hits", card_values.get("multiple_hits", 0))
+        set_field(self, "hits", card_values.get("hits", 0))
+        set_field(self, "strength_multiplier", card_values.get("strength_multiplier", 0))
+        set_field(self, "exhaust", "exhaust" in card_values)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"CardSpec {self.name} is read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"CardSpec {self.name} is read-only")
+
+    def __repr__(self):
+        return f"CardSpec({self.name})"
+
+    # Copies and unpickled cards keep pointing to the interned spec
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return get_card_spec, (self.name,)
+
+
+card_specs = {
+    card_name: CardSpec(card_name, card_values)
+    for card_name, card_values in ironclad_cards.items()
+}
+
+# The spec of the cards that are not in the dictionary, statuses, curses and the cards of other classes
+unknown_card_spec = CardSpec(None, {})
+
+
+def get_card_spec(card_name, upgrades=0):
+    """The interned spec of a card. Cards upgraded more than once are named like "Searing Blow+2", they get the spec of the upgraded card"""
+    spec = card_specs.get(card_name)
+    if spec is None and upgrades > 0 and card_name:
+        spec = card_specs.get(card_name.split("+")[0] + "+")
+    return spec if spec is not None else unknown_card_spec
@@ -0,0 +1,41 @@
+"""Searches every fixture with verify_bound on, which explores the subtrees the optimistic bound would prune and asserts
+the bound is never lower than the best eval found below it. The decisions of the full search are compared with the
+decisions of the pruned search, branch-and-bound must not change them.
+
+Run from the root of the repository:
+    python checks/check_bound.py
+"""
+
+import sys
+
+from fixtures import load_states, make_agent
+
+
+def get_decision(game, verify_bound):
+    agent = make_agent(game, verify_bound=verify_bound)
+    try:
+        max_eval, (card, target), _ = agent.expectimax()
+    except AssertionError as error:
+        return str(error), None, None, []
+    return (
+        max_eval,
+        card.uuid if card is not None else None,
+        target.monster_index if target is not None else None,
+        [card.uuid for card in agent.principal_variation],
+    )
+
+
+if __name__ == "__main__":
+    full_decisions = [get_decision(game, True) for game in load_states()]
+    pruned_decisions = [get_decision(game, False) for game in load_states()]
+
+    differences = 0
+    for index, (full_decision, pruned_decision) in enumerate(
+        zip(full_decisions, pruned_decisions)
+    ):
+        if full_decision != pruned_decision:
+            differences += 1
+            print(f"state {index}: full search {full_decision} pruned {pruned_decision}")
+
+    print(f"{len(full_decisions)} states, {differences} different decisions")
+    sys.exit(1 if differences else 0)
@@ -0,0 +1,161 @@
+"""Checks the CombatArrays of every supported fixture against the object simulation.
+Each state has to come back unchanged from from_game and to_game, and every sequence of up to three supported cards, on every
+target, has to give the same state played on the arrays as played by simulate_card_play. The search of every state whose
+playable cards are all supported has to take the same decision with array_search on and off.
+
+Run from the root of the repository, another file of states can be given:
+    python checks/check_combat_arrays.py [states.jsonl]
+"""
+
+import sys
+from collections import Counter
+
+from fixtures import COMBAT_STATES, load_states, make_agent
+from spirecomm.ai.agent import SimpleAgent
+from spirecomm.ai.combat_arrays import (
+    CombatArrays,
+    get_card_unsupported_reason,
+    get_search_unsupported_reason,
+    get_unsupported_reason,
+    piles,
+    play_card,
+)
+
+MAX_CARDS = 3
+
+
+def powers_fingerprint(character):
+    return [
+        (
+            power.power_id,
+            power.power_name,
+            power.amount,
+            power.damage,
+            power.misc,
+            power.just_applied,
+            power.card,
+        )
+        for power in character.powers
+    ]
+
+
+def get_fingerprint(game_state):
+    """Everything the simulation of the supported cards can change"""
+    player = game_state.player
+    return (
+        (player.current_hp, player.max_hp, player.block, player.energy),
+        powers_fingerprint(player),
+        [
+            (
+                monster.current_hp,
+                monster.max_hp,
+                monster.block,
+                monster.is_gone,
+                monster.move_adjusted_damage,
+                powers_fingerprint(monster),
+            )
+            for monster in game_state.monsters
+        ],
+        (
+            game_state.damage_dealt,
+            game_state.instances_of_damage,
+            game_state.cards_drawn_this_turn,
+            game_state.turn,
+        ),
+        [[card.uuid for card in getattr(game_state, pile)] for pile in piles],
+    )
+
+
+def get_plays(game_state):
+    """(card, target) of every supported card of the hand the player has the energy for"""
+    plays = []
+    for card in game_state.hand:
+        if card.cost > game_state.player.energy or get_card_unsupported_reason(card):
+            continue
+        if card.has_target:
+            plays.extend(
+                (card, monster)
+                for monster in game_state.monsters
+                if monster.current_hp > 0 and not monster.is_gone
+            )
+        else:
+            plays.append((card, None))
+    return plays
+
+
+def check_plays(agent, game_state, arrays, depth, counts):
+    """Plays every supported card on both simulations and recurses, returns the number of differences"""
+    differences = 0
+    for card, target in get_plays(game_state):
+        expected = agent.simulate_card_play(
+            game_state.clone_for_simulation(), card, target
+        )
+        played = play_card(arrays.copy(), card, target)
+        counts["plays"] += 1
+        if get_fingerprint(played.to_game()) != get_fingerprint(expected):
+            differences += 1
+            print(f"{card.card_id} on {target.name if target else None} differs:")
+            print(f"  arrays  {get_fingerprint(played.to_game())}")
+            print(f"  objects {get_fingerprint(expected)}")
+        elif depth < MAX_CARDS:
+            differences += check_plays(agent, expected, played, depth + 1, counts)
+    return differences
+
+
+def get_decision(game, array_search):
+    agent = make_agent(game, array_search=array_search)
+    max_eval, (card, target), _ = agent.expectimax()
+    return (
+        max_eval,
+        card.uuid if card is not None else None,
+        target.monster_index if target is not None else None,
+        [card.uuid for card in agent.principal_variation],
+    )
+
+
+def check_search(game):
+    """Searches a copy of game with the arrays and without, returns None when the cards aren't all supported, else whether both agree"""
+    agent = make_agent(game.clone_for_simulation())
+    playable_cards = agent.init_playable_cards(agent.game)
+    agent.set_real_costs(agent.game, playable_cards)
+    if get_search_unsupported_reason(agent.game, playable_cards) is not None:
+        return None
+    array_decision = get_decision(game.clone_for_simulation(), True)
+    object_decision = get_decision(game.clone_for_simulation(), False)
+    if array_decision != object_decision:
+        print(f"  arrays  {array_decision}")
+        print(f"  objects {object_decision}")
+    return array_decision == object_decision
+
+
+if __name__ == "__main__":
+    agent = SimpleAgent()
+    counts = Counter()
+    unsupported = Counter()
+    differences = 0
+    path = sys.argv[1] if len(sys.argv) > 1 else COMBAT_STATES
+    for index, game in enumerate(load_states(path)):
+        reason = get_unsupported_reason(game)
+        if reason is not None:
+            unsupported[reason] += 1
+            continue
+        counts["states"] += 1
+        arrays = CombatArrays.from_game(game)
+        if get_fingerprint(arrays.to_game()) != get_fingerprint(game):
+            differences += 1
+            print(f"state {index} changed in the arrays")
+            continue
+        differences += check_plays(agent, game, arrays, 1, counts)
+        same_decision = check_search(game)
+        if same_decision is not None:
+            counts["searches"] += 1
+            if not same_decision:
+                differences += 1
+                print(f"state {index} takes another decision with array_search")
+
+    print(
+        f"{counts['states']} states, {counts['plays']} card plays and {counts['searches']} searches checked, {differences} differences"
+    )
+    for reason, count in unsupported.most_common():
+        print(f"  {count} states unsupported: {reason}")
+    sys.exit(1 if differences else 0)
@@ -0,0 +1,80 @@
+"""Checks the lazy sections of Game.from_json on every fixture, and on the same message out of combat.
+Whatever order the sections are read in, and whether the game is pickled or cloned before any is read, the game has to end up
+the same as with every section built by load_sections.
+
+Run from the root of the repository, another file of states can be given:
+    python checks/check_lazy_game.py [states.jsonl]
+"""
+
+import copy
+import json
+import pickle
+import sys
+
+from fixtures import COMBAT_STATES
+from spirecomm.spire.game import Game, LazyGame
+from spirecomm.spire.undo import UndoLog
+
+
+def get_fingerprint(game):
+    """Whether the game is still lazy and every field pickled on its own, the objects a pickle round trip makes shared between
+    fields don't count
+    """
+    game.load_sections()
+    return isinstance(game, LazyGame), sorted(
+        (name, pickle.dumps(value)) for name, value in Game.__getstate__(game).items()
+    )
+
+
+def read_in_order(game, names):
+    for name in names:
+        getattr(game, name)
+    return game
+
+
+def read_while_recording(game):
+    """Reads every section for the first time inside an UndoLog, then undoes the log: building isn't recorded, the
+    sections stay built and the undo doesn't fail
+    """
+    with UndoLog() as log:
+        mark = log.mark()
+        read_in_order(game, LazyGame.lazy_sections)
+        log.undo(mark)
+    return game
+
+
+def get_variants(json_state, available_commands):
+    """(description, game) of every way of reaching the sections"""
+    make = lambda: Game.from_json(json_state, available_commands)
+    return [
+        ("read in order", read_in_order(make(), LazyGame.lazy_sections)),
+        ("read in reverse", read_in_order(make(), reversed(LazyGame.lazy_sections))),
+        ("pickled first", pickle.loads(pickle.dumps(make()))),
+        ("cloned first", make().clone_for_simulation()),
+        ("deep copied first", copy.deepcopy(make())),
+        ("read while an UndoLog records", read_while_recording(make())),
+    ]
+
+
+def get_messages(path):
+    with open(path) as fixtures:
+        messages = [json.loads(line) for line in fixtures if line.strip()]
+    for message in messages:
+        yield message["game_state"], message["available_commands"]
+        out_of_combat = dict(message["game_state"], room_phase="EVENT", screen_type="NONE")
+        yield out_of_combat, message["available_commands"]
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else COMBAT_STATES
+    checked = 0
+    differences = 0
+    for index, (json_state, available_commands) in enumerate(get_messages(path)):
+        expected = get_fingerprint(Game.from_json(json_state, available_commands))
+        for description, game in get_variants(json_state, available_commands):
+            checked += 1
+            if get_fingerprint(game) != expected:
+                differences += 1
+                print(f"message {index} differs when {description}")
+    print(f"{checked} games checked, {differences} differences")
+    sys.exit(1 if differences else 0)
@@ -0,0 +1,48 @@
+"""Runs the search over the fixtures with verify_running_totals on, with undo_simulation on and off.
+Every evaluated node checks the running totals of evaluate_state and the state hash against a count from scratch.
+Prints how many cards each card effect moved through the totals so a fixture losing its coverage is noticed.
+
+Run from the root of the repository:
+    python checks/check_running_totals.py
+"""
+
+import sys
+from collections import Counter
+
+from fixtures import load_states, make_agent
+import spirecomm.ai.card_effects as card_effects
+import spirecomm.ai.running_totals as running_totals
+
+tracked_effects = Counter()
+
+
+def count_calls(name):
+    track = getattr(running_totals, name)
+
+    def counted_track(*args):
+        tracked_effects[sys._getframe(1).f_code.co_name] += 1
+        return track(*args)
+
+    setattr(card_effects, name, counted_track)
+
+
+if __name__ == "__main__":
+    for name in ["track_card_added", "track_card_removed", "track_card_exhausted"]:
+        count_calls(name)
+
+    failures = 0
+    for undo_simulation in (True, False):
+        for index, game in enumerate(load_states()):
+            agent = make_agent(
+                game, undo_simulation=undo_simulation, verify_running_totals=True
+            )
+            try:
+                agent.expectimax()
+            except AssertionError as error:
+                failures += 1
+                print(f"state {index}, undo_simulation={undo_simulation}: {error}")
+
+    for effect, cards in sorted(tracked_effects.items()):
+        print(f"{effect}: {cards} cards")
+    print(f"{failures} failures")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,63 @@
+"""Searches every fixture with undo_simulation on and off and checks both modes take the same decisions.
+The undo log rolls the state back after every card instead of copying it, the chosen card and target, the principal variation
+and the eval of every node, in the order they were evaluated, have to be bit-identical.
+verify_running_totals is on so a pile the undo log doesn't restore is caught even when no eval changes.
+
+Run from the root of the repository:
+    python checks/check_undo_simulation.py
+"""
+
+import sys
+
+from fixtures import load_states, make_agent
+from spirecomm.ai.agent import SimpleAgent
+
+
+class RecordingAgent(SimpleAgent):
+    """Keeps the eval of every node it evaluates"""
+
+    def __init__(self):
+        super().__init__()
+        self.evals = []
+
+    def evaluate_state(self, game_state, hp_loss=0):
+        eval = super().evaluate_state(game_state, hp_loss)
+        self.evals.append(eval)
+        return eval
+
+
+def get_decision(game, undo_simulation):
+    agent = make_agent(
+        game,
+        RecordingAgent,
+        undo_simulation=undo_simulation,
+        verify_running_totals=True,
+    )
+    try:
+        max_eval, (card, target), _ = agent.expectimax()
+    except AssertionError as error:
+        return str(error), None, None, [], agent.evals
+    return (
+        max_eval,
+        card.uuid if card is not None else None,
+        target.monster_index if target is not None else None,
+        [card.uuid for card in agent.principal_variation],
+        agent.evals,
+    )
+
+
+if __name__ == "__main__":
+    undo_decisions = [get_decision(game, True) for game in load_states()]
+    copy_decisions = [get_decision(game, False) for game in load_states()]
+
+    differences = 0
+    for index, (undo_decision, copy_decision) in enumerate(
+        zip(undo_decisions, copy_decisions)
+    ):
+        if undo_decision != copy_decision:
+            differences += 1
+            print(f"state {index}: undo {undo_decision[:4]} copy {copy_decision[:4]}")
+
+    nodes = sum(len(decision[4]) for decision in undo_decisions)
+    print(f"{len(undo_decisions)} states, {nodes} nodes, {differences} different decisions")
+    sys.exit(1 if differences else 0)
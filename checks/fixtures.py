@@ -0,0 +1,38 @@
+"""Combat states for the checks of this directory.
+
+combat_states.jsonl holds one message of the game per line, as CommunicationMod sends it. The first one is a hand of
+Fiend Fire, Second Wind, Power Through and Immolate with a Burn and a Wound, the others were picked so every card effect that
+moves cards between piles, and the kill of a leader, comes up in several searches.
+"""
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spirecomm.ai.agent import SimpleAgent
+from spirecomm.spire.game import Game
+
+COMBAT_STATES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "combat_states.jsonl")
+
+
+def load_states(path=COMBAT_STATES):
+    """A new Game for every message of the file, a search can be run once on each"""
+    with open(path) as fixtures:
+        messages = [json.loads(line) for line in fixtures if line.strip()]
+    return [
+        Game.from_json(message["game_state"], message["available_commands"])
+        for message in messages
+    ]
+
+
+def make_agent(game, agent_class=SimpleAgent, **flags):
+    """An agent searching game in this process without a time limit, so every run explores the same nodes"""
+    agent = agent_class()
+    agent.parallel_search = False
+    agent.decision_time_limit = None
+    for name, value in flags.items():
+        setattr(agent, name, value)
+    agent.game = game
+    return agent
@@ -1,12 +1,32 @@
-import itertools
 import copy
-from card_dictionary import get_card_values, ironclad_archetypes, ironclad_relic_values
-from spirecomm.spire.card import Card, CardType
+import pickle
+import sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from card_dictionary import ironclad_archetypes, ironclad_relic_values
 from spirecomm.spire.game import Game
 from spirecomm.spire.character import PlayerClass
 from spirecomm.spire.screen import RestOption
+from spirecomm.spire.undo import UndoLog, record_list
 from spirecomm.communication.action import *
 from spirecomm.ai.priorities import IroncladPriority
+from spirecomm.ai.card_effects import (
+    CardPlay,
+    deal_damage,
+    get_card_program,
+    handle_enemy_powers,
+)
+from spirecomm.ai.combat_context import get_combat_context
+from spirecomm.ai.running_totals import (
+    count_hand_burns,
+    count_monster_damage,
+    count_running_terms,
+    hand_burn_damage,
+    player_has_intangible,
+    start_running_totals,
+    track_card_removed,
+)
+from spirecomm.ai.state_hash import get_state_hash
 import logging
 import time
 
@@ -14,43 +34,129 @@ import time
 logging.basicConfig(filename="best_simulated_states.log", level=logging.INFO)
 
 
-class GameStateCache:
-    """This is the cache that is used for the already explored combinations in the expectimax algorithm"""
+def approximate_size(key):
+    """Approximate bytes taken by a transposition key"""
+    if isinstance(key, tuple):
+        return sys.getsizeof(key) + sum(approximate_size(item) for item in key)
+    # Small ints and the strings, the card and power ids, are shared with the game state
+    if isinstance(key, str) or (isinstance(key, int) and -5 <= key <= 256):
+        return 0
+    return sys.getsizeof(key)
 
-    def __init__(self):
-        self.cache = {}
+
+class GameStateCache:
+    """This is the transposition table of the expectimax algorithm. Different orders of the same cards often reach the exact same state,
+    [Defend, Strike] and [Strike, Defend] for example, so states are keyed on a 64 bit hash of everything the simulation and the evaluation look at.
+    Two different states of one decision sharing a hash are about as likely as 1 in 10**9, the search would then take the eval of one for the other.
+    The table lives as long as the agent and is bounded by memory_budget bytes, the least recently used states are evicted first.
+    A memory_budget of None never evicts, the tables of the search pool workers are unbounded, see parallel_search_depth.
+    Keys are immutable tuples and the stored evals are ints so nothing is ever copied. Every key of a search holds the same cards,
+    so the size of the first one is used for all of them.
+    """
+
+    # Bytes of the table's own bookkeeping for one entry
+    entry_overhead = 110
+
+    def __init__(self, memory_budget=256 * 1024 * 1024):
+        self.cache = OrderedDict()
+        self.memory_budget = memory_budget
+        self.entry_size = None
+        self.bytes = 0
+        self.peak_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def get_key(game_state, remaining_energy):
+        """Key of a simulated combat state, the energy left and the Zobrist hash of the state, see spirecomm.ai.state_hash.
+        The order of powers and of the cards inside each pile does not matter. During a search the running totals keep the hash up to date
+        """
+        running_totals = game_state.running_totals
+        if running_totals is None:
+            return remaining_energy, get_state_hash(game_state)
+        return remaining_energy, running_totals.state_hash
 
     def get_state(self, key):
-        """Retrieve both the cached state and the target for the first card, if applicable."""
-        state, target, eval = self.cache.get(key, (None, None, None))
-        return copy.deepcopy(state), target, eval
-
-    def store_state(self, key, state, target, eval):
-        """Store both the state and the target for the first card in the cache."""
-        if state is not None:
-            self.cache[key] = (copy.deepcopy(state), target, eval)
+        """Retrieve the eval of an already explored state, None if the state was never seen"""
+        eval = self.cache.get(key)
+        if eval is None:
+            self.misses += 1
         else:
-            logging.warning(f"Attempted to store None state for key {key}")
-
-
-class SimGame:
-    def __init__(self):
-        self.in_combat = False
-        self.player = None
-        self.monsters = []
-        self.draw_pile = []
-        self.discard_pile = []
-        self.exhaust_pile = []
-        self.hand = []
-        self.limbo = []
-        self.card_in_play = None
-        self.turn = 0
-        self.cards_discarded_this_turn = 0
-        self.gold = 0
-        self.decision = []
-        self.grade = None
-        self.played_cards = []
-        self.played_a_potion = False
+            self.hits += 1
+            self.cache.move_to_end(key)
+        return eval
+
+    def store_state(self, key, eval):
+        """Store the eval of an explored state"""
+        if key in self.cache:
+            self.cache[key] = eval
+            self.cache.move_to_end(key)
+            return
+
+        if self.entry_size is None:
+            self.entry_size = approximate_size(key) + self.entry_overhead
+        self.cache[key] = eval
+        self.bytes += self.entry_size
+        self.peak_bytes = max(self.peak_bytes, self.bytes)
+
+        while (
+            self.memory_budget is not None
+            and self.bytes > self.memory_budget
+            and self.cache
+        ):
+            self.cache.popitem(last=False)
+            self.bytes -= self.entry_size
+            self.evictions += 1
+
+    def clear(self):
+        """Forgets every state, an entry means its subtree was explored by the current search so they can't be carried over to the next one.
+        The statistics are kept for the whole run
+        """
+        self.cache.clear()
+        self.entry_size = None
+        self.bytes = 0
+
+    def get_stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self.cache),
+            "bytes": self.bytes,
+            "peak_bytes": self.peak_bytes,
+        }
+
+
+class SearchTimeout(Exception):
+    """Raised inside the expectimax search when the time for a decision has run out"""
+
+
+class SearchResult:
+    """The best combo found by one depth of the expectimax search, or by one worker of the search pool for the subtree of its first card"""
+
+    def __init__(self, max_eval, table=None):
+        self.max_eval = max_eval
+        self.best_action = (None, None)
+        self.best_depth = 0
+        # Indexes in the playable cards of the whole best combo, the principal variation
+        self.best_line = ()
+        # (transposition keys of the states on the way, card indexes) of every combo reaching max_eval at best_depth
+        self.best_combos = []
+        # Eval of the state after the first card, a worker of the search pool explores a single first card
+        self.first_card_eval = None
+        self.depth_limited = False
+        self.table = table if table is not None else GameStateCache()
+
+
+def search_root_subtree(payload, root_index, max_depth, starting_eval, deadline):
+    """Runs in a worker of the search pool, explores every combo starting with the card at root_index"""
+    agent, playable_cards = pickle.loads(payload)
+    result = SearchResult(starting_eval, agent.transposition_table)
+    agent.search_depth(
+        result, agent.game, playable_cards, max_depth, deadline, root_index
+    )
+    return result
 
 
 class SimpleAgent:
@@ -64,11 +170,45 @@ class SimpleAgent:
         self.priorities = IroncladPriority()
         self.change_class(chosen_class)
         self.initial_depth = 10
+        self.transposition_table = GameStateCache()
+        self.evaluation_cache = GameStateCache(64 * 1024 * 1024)
+        self.undo_simulation = True
+        # Play the cards on CombatArrays when the state and the cards are supported, see spirecomm.ai.combat_arrays
+        self.array_search = False
+        self.verify_bound = False
+        self.verify_shared_sections = False
+        self.verify_running_totals = False
+        self.decision_time_limit = 3.0
+        self.completed_depth = 0
+        self.parallel_search = True
+        self.parallel_min_cards = 6
+        self.search_workers = None
+        self.search_pool = None
+        self.principal_variation = []
+        self.plan = []
+        self.plan_card = None
+        self.plan_state = None
+        self.plan_eval = None
+        self.plan_hits = 0
+        self.plan_misses = 0
         self.feed_effect_used = False
         self.map_route = []
         self.player_current_hp = 80
         self.player_max_hp = 80
 
+    def __getstate__(self):
+        """The agent is sent to the workers of the search pool, the pool itself, the transposition table, the memoized evals and the plan stay here.
+        A worker starts with an unbounded table, every key it stores is needed by the merge of parallel_search_depth
+        """
+        state = self.__dict__.copy()
+        state["search_pool"] = None
+        state["transposition_table"] = GameStateCache(None)
+        state["evaluation_cache"] = GameStateCache(self.evaluation_cache.memory_budget)
+        state["principal_variation"] = []
+        state["plan"] = []
+        state["plan_state"] = None
+        return state
+
     def change_class(self, new_class):
         """This can theoritically be used to cycle between classes, only ironclad works.."""
         self.chosen_class = PlayerClass.IRONCLAD
@@ -162,75 +302,49 @@ class SimpleAgent:
         return StartGameAction(self.chosen_class)
 
     def get_incoming_damage(self, game_state):
-        """Calculates the damage the agent is receiving this turn. Also accounts for every possible thing that might add or reduce damage"""
+        """Calculates the damage the agent is receiving this turn. Also accounts for every possible thing that might add or reduce damage.
+        game_state is only read, the same state always gives the same damage.
+        The damage of the monsters only changes with the monsters and Intangible, during a search the running totals keep it up to date,
+        see spirecomm.ai.running_totals. What the player's block, powers and hand add to it is counted by get_player_damage
+        """
+        if game_state.running_totals is None:
+            monster_damage = count_monster_damage(game_state)
+        else:
+            monster_damage = game_state.running_totals.monster_damage
+        return monster_damage + self.get_player_damage(game_state)
 
-        has_intangible = False
-        has_torii = False
-        has_trod = False
+    def get_player_damage(self, game_state):
+        """The player's side of get_incoming_damage: block, Orichalcum, Plated Armor, Metallicize, Constricted, the Burns and Decays
+        in hand and the hits taken from Thorns and Sharp Hide. During a search the running totals count the Burns and Decays
+        """
+
+        context = get_combat_context(game_state)
+        has_torii = context.has_torii
+        has_trod = context.has_trod
         incoming_damage = 0
         incoming_damage -= game_state.player.block
 
-        for relic in game_state.relics:
-            if relic.name == "Orichalcum" and game_state.player.block == 0:
-                incoming_damage -= 6
-            if relic.name == "Torii":
-                has_torii = True
-            if relic.name == "Tungsten Rod":
-                has_trod = True
+        if context.has_orichalcum and game_state.player.block == 0:
+            incoming_damage -= 6
 
-        for power in game_state.player.powers:
-            if power.power_id in ["Plated Armor", "Metallicize"]:
-                incoming_damage -= power.amount
-            if power.power_id == "Intangible":
-                has_intangible = True
-            if power.power_id == "Constricted":
-                if has_intangible:
-                    if not has_trod:
-                        incoming_damage += 1
-                else:
-                    incoming_damage += power.amount
-
-        for monster in game_state.monsters:
-            if monster.current_hp > 0 and not monster.is_gone:
-                if (
-                    monster.move_adjusted_damage is not None
-                    and monster.move_adjusted_damage > 0
-                ):
-                    if has_intangible:
-                        if not has_trod:
-                            incoming_damage += 1 * monster.move_hits
-                    else:
-                        if monster.move_adjusted_damage <= 5 and has_torii:
-                            monster.move_adjusted_damage = 1
-                        if has_trod:
-                            monster.move_adjusted_damage -= 1
-
-                        incoming_damage += (
-                            monster.move_adjusted_damage * monster.move_hits
-                        )
+        player = game_state.player
+        incoming_damage -= player.power_amount("Plated Armor")
+        incoming_damage -= player.power_amount("Metallicize")
+        has_intangible = player_has_intangible(player)
+        if player.get_power("Constricted") is not None:
+            if has_intangible:
+                if not has_trod:
+                    incoming_damage += 1
+            else:
+                incoming_damage += player.power_amount("Constricted")
 
-        for card in game_state.hand:
-            if card.name == "Burn":
-                burn_damage = 2
-                if has_intangible or has_torii:
-                    burn_damage = 1
-                if has_trod:
-                    burn_damage -= 1
-                incoming_damage += burn_damage
-            if card.name == "Burn+":
-                burn_damage = 4
-                if has_intangible or has_torii:
-                    burn_damage = 1
-                if has_trod:
-                    burn_damage -= 1
-                incoming_damage += burn_damage
-            if card.name == "Decay":
-                decay_damage = 2
-                if has_intangible or has_torii:
-                    decay_damage = 1
-                if has_trod:
-                    decay_damage -= 1
-                incoming_damage += decay_damage
+        if game_state.running_totals is None:
+            hand_burns = count_hand_burns(game_state.hand)
+        else:
+            hand_burns = game_state.running_totals.hand_burns
+        incoming_damage += hand_burn_damage(
+            hand_burns, has_intangible, has_torii, has_trod
+        )
 
         if game_state.instances_of_damage > 0:
             if has_intangible:
@@ -249,45 +363,50 @@ class SimpleAgent:
             if monster.current_hp > 0 and monster.is_gone == False
         ]
 
-        # Check for a special targets
-        wizard_target = next(
-            (monster for monster in alive_monsters if monster.name == "Gremlin Wizard"),
-            None,
-        )
-
-        sentry_target = next(
-            (monster for monster in alive_monsters if monster.name == "Sentry"),
-            None,
-        )
+        # Check for a special targets, most fights have none
+        if get_combat_context(game_state).has_special_targets:
+            wizard_target = next(
+                (
+                    monster
+                    for monster in alive_monsters
+                    if monster.name == "Gremlin Wizard"
+                ),
+                None,
+            )
 
-        torch_head_target = next(
-            (monster for monster in alive_monsters if monster.name == "Torch Head"),
-            None,
-        )
+            sentry_target = next(
+                (monster for monster in alive_monsters if monster.name == "Sentry"),
+                None,
+            )
 
-        donu_target = next(
-            (monster for monster in alive_monsters if monster.name == "Donu"),
-            None,
-        )
+            torch_head_target = next(
+                (monster for monster in alive_monsters if monster.name == "Torch Head"),
+                None,
+            )
 
-        centurion_target = next(
-            (monster for monster in alive_monsters if monster.name == "Centurion"),
-            None,
-        )
+            donu_target = next(
+                (monster for monster in alive_monsters if monster.name == "Donu"),
+                None,
+            )
 
-        if sentry_target or alive_monsters.count == 1 or centurion_target:
-            return alive_monsters[0]
+            centurion_target = next(
+                (monster for monster in alive_monsters if monster.name == "Centurion"),
+                None,
+            )
 
-        if torch_head_target:
-            if len(alive_monsters) == 1 or len(alive_monsters) == 3:
+            if sentry_target or alive_monsters.count == 1 or centurion_target:
                 return alive_monsters[0]
-            return alive_monsters[1]
 
-        if wizard_target:
-            return wizard_target
+            if torch_head_target:
+                if len(alive_monsters) == 1 or len(alive_monsters) == 3:
+                    return alive_monsters[0]
+                return alive_monsters[1]
 
-        if donu_target:
-            return donu_target
+            if wizard_target:
+                return wizard_target
+
+            if donu_target:
+                return donu_target
 
         # Filter to find monsters that are actively attacking
         attacking_monsters = [
@@ -358,16 +477,14 @@ class SimpleAgent:
         """Narrows down the possible actions by removing cards from hand. The result from this is used to simulate all states"""
 
         def is_pure_block_card(card):
-            card_values = get_card_values(card.name)
-            if not ("block" in card_values and "damage" in card_values):
-                return False
+            spec = card.spec
             return (
-                card_values["block"] > 0
+                spec.block > 0
                 and card.type.name == "SKILL"
                 and card.card_id
                 not in ["Armaments", "Flame Barrier", "Sentinel", "True Grit"]
-                and not "draw" in card_values
-                and card_values["damage"] == 0
+                and not spec.draw
+                and spec.damage == 0
             )
 
         playable_cards = []
@@ -406,14 +523,7 @@ class SimpleAgent:
         # Ensure priority cards are played first if available
         for card in playable_cards:
             if card.card_id == "Limit Break":
-                current_strength = next(
-                    (
-                        buff.amount
-                        for buff in game_state.player.powers
-                        if buff.power_id == "Strength"
-                    ),
-                    0,
-                )
+                current_strength = game_state.player.power_amount("Strength")
                 if current_strength <= 0:
                     playable_cards.remove(card)
             if card.card_id == "Exhume":
@@ -421,10 +531,9 @@ class SimpleAgent:
                     playable_cards.remove(card)
             if card.card_id == "Bloodletting":
 
-                card_values = get_card_values(card.name)
-                energy_given = card_values["gain_energy"]
+                energy_given = card.spec.gain_energy
 
-                temp_game_state = copy.deepcopy(game_state)
+                temp_game_state = game_state.clone_for_simulation()
                 temp_playable_cards = copy.deepcopy(playable_cards)
 
                 temp_playable_cards.remove(card)
@@ -454,146 +563,676 @@ class SimpleAgent:
                     playable_cards.remove(card)
         return playable_cards
 
+    def get_optimistic_bound(self, game_state, eval, remaining_cards, remaining_energy):
+        """Upper bound of the eval that playing any of the remaining cards on top of game_state can reach. Used by expectimax to skip subtrees that can't beat the best combo.
+        Every card is credited with the best case of everything it can add to evaluate_state: damage with all the strength it could ever have, block, strength, debuffs, powers, draws.
+        Kills are granted as soon as the optimistic damage could pay for them. It doesn't need to be accurate, it must just never be lower than the real value.
+        """
+
+        def fractional_knapsack(items, budget):
+            """Best total value of (cost, value) items under the budget when a card may be played partially, always >= the real best"""
+            total = 0
+            for cost, value in sorted(
+                items, key=lambda item: item[1] / item[0] if item[0] > 0 else float("inf"), reverse=True
+            ):
+                if value <= 0:
+                    continue
+                if cost <= budget:
+                    total += value
+                    budget -= cost
+                else:
+                    total += value * budget / cost
+                    break
+            return total
+
+        if not remaining_cards:
+            return eval
+        # A dead player can still be saved by the block of the next cards, there is nothing to bound here
+        if eval == -1000000:
+            return float("inf")
+
+        player = game_state.player
+        alive_monsters = [
+            monster
+            for monster in game_state.monsters
+            if monster.current_hp > 0 and not monster.is_gone
+        ]
+        monster_count = max(1, len(alive_monsters))
+        context = get_combat_context(game_state)
+        relic_names = context.relic_names
+        all_values = [card.spec.values for card in remaining_cards]
+        havoc_values = [card.spec.values for card in game_state.draw_pile]
+        status_in_hand = sum(
+            1 for card in game_state.hand if card.type.name in ["STATUS", "CURSE"]
+        )
+        duplication = 2 if player.power_amount("DuplicationPower") else 1
+
+        # The most strength, block, energy and power amounts we could ever have in this subtree
+        strength = player.power_amount("Strength")
+        max_strength = strength + sum(
+            values.get("strength", 0) * duplication for values in all_values
+        )
+        rupture = player.power_amount("Rupture") + sum(
+            values.get("gain_strength_on_hp_loss_from_playing_cards", 0)
+            for values in all_values
+        )
+        # Rupture only triggers on cards that lose hp, or on every card once Brutality is in play
+        if player.power_amount("Brutality") or any(
+            "lose_hp_per_turn" in values for values in all_values
+        ):
+            max_strength += rupture * len(remaining_cards) * duplication
+        else:
+            max_strength += rupture * duplication * sum(
+                1 for values in all_values if "lose_hp" in values
+            )
+        for values in all_values:
+            if "double_strength" in values and max_strength > 0:
+                max_strength *= 2**duplication
+        attack_strength = max(0, max_strength)
+        dexterity = max(0, player.power_amount("Dexterity"))
+        max_energy = player.energy + sum(
+            values.get("gain_energy", 0) + values.get("gain_energy_on_exhaust", 0)
+            for values in all_values
+        )
+        flame_barrier = player.power_amount("Flame Barrier") + sum(
+            values.get("damage_on_attack", 0) for values in all_values
+        )
+        juggernaut = player.power_amount("Juggernaut") + sum(
+            values.get("damage_on_block", 0) for values in all_values
+        )
+        feel_no_pain = player.power_amount("Feel No Pain") + sum(
+            values.get("gain_block_on_exhaust", 0) for values in all_values
+        )
+
+        damage_multiplier = 1
+        if "Pen Nib" in relic_names:
+            damage_multiplier *= 2
+        if any(monster.has_debuff("Vulnerable") for monster in alive_monsters) or any(
+            "vulnerable" in values or "vulnerable_aoe" in values for values in all_values
+        ):
+            # The vulnerable multiplier is applied once per relic in deal_damage
+            vulnerable_multiplier = 1.75 if "Paper Phrog" in relic_names else 1.5
+            damage_multiplier *= vulnerable_multiplier ** max(1, len(relic_names))
+        extra_hp_loss = max(
+            [
+                monster.max_hp
+                for monster in alive_monsters
+                if any(power.power_id in ["Split", "Mode Shift"] for power in monster.powers)
+            ],
+            default=0,
+        )
+        thorns = any(
+            power.power_id in ["Sharp Hide", "Thorns"]
+            for monster in alive_monsters
+            for power in monster.powers
+        )
+
+        # Blocking, killing attackers or anything else that lowers the incoming damage is worth at most 32 (20 for the damage, 12 for the hp) per point of it
+        incoming_damage = (
+            player.power_amount("Constricted")
+            + 4 * sum(1 for card in game_state.hand if card.name in ["Burn", "Burn+", "Decay"])
+            + 3 * game_state.instances_of_damage
+            - player.block
+        )
+        for monster in alive_monsters:
+            if monster.move_adjusted_damage is not None and monster.move_adjusted_damage > 0:
+                incoming_damage += monster.move_adjusted_damage * max(1, monster.move_hits)
+
+        max_block = player.block
+        for values in all_values:
+            block = 0
+            if values.get("block", 0) > 0:
+                block += values["block"] + dexterity
+            if "exhaust_non_attack" in values:
+                exhausted = len(game_state.hand)
+                block += (values.get("block_per_exhaust", 0) + dexterity) * exhausted * (exhausted + 1) // 2
+            block += values.get("block_on_attack", 0)
+            exhausted_cards = 0
+            if "exhaust" in values:
+                exhausted_cards += 1
+            if "exhaust_hand" in values or "exhaust_non_attack" in values:
+                exhausted_cards += len(game_state.hand)
+            block += feel_no_pain * exhausted_cards
+            max_block += block * duplication
+        for values in all_values:
+            if "double_block" in values:
+                max_block *= 2**duplication
+
+        def card_gains(values):
+            """(damage_dealt, monster hp lost, everything else) a single play of a card can add"""
+            per_hit = values.get("damage", 0)
+            if "based_on_block" in values:
+                per_hit = max_block
+            card_hits = max(1, values.get("multiple_hits", 0), values.get("hits", 0))
+            if "exhaust_hand" in values:
+                card_hits = max(card_hits, len(game_state.hand))
+            damage = 0
+            if per_hit > 0 or "whirlwind_handle" in values:
+                per_hit += attack_strength
+                if "strength_multiplier" in values:
+                    per_hit += max(1, attack_strength) * values["strength_multiplier"]
+                if "Akabeko" in relic_names and game_state.turn == 0:
+                    per_hit += 8
+                hits = card_hits
+                if "aoe" in values:
+                    hits *= monster_count
+                if "whirlwind_handle" in values:
+                    hits = max_energy * monster_count
+                damage = per_hit * damage_multiplier * hits
+            damage_dealt = damage
+            hp_lost = damage + extra_hp_loss + juggernaut
+            if flame_barrier > 0:
+                damage_dealt += damage + flame_barrier * monster_count
+                hp_lost += flame_barrier * monster_count
+
+            gain = 0
+            if thorns and damage > 0:
+                gain += 9 * card_hits * monster_count
+            gain += 100 * values.get("vulnerable", 0)
+            gain += 100 * values.get("weak", 0)
+            gain += 100 * values.get("reduce_strength", 0)
+            gain += 100 * monster_count * values.get("vulnerable_aoe", 0)
+            gain += 100 * monster_count * values.get("weak_aoe", 0)
+            for power_key in [
+                "self_vulnerable",
+                "draw_on_exhaust",
+                "gain_block_on_exhaust",
+                "give_power_per_turn",
+                "block_never_expires",
+                "skills_cost_zero",
+                "damage_on_block",
+            ]:
+                if power_key in values:
+                    gain += 400
+            if "draw" in values:
+                gain += 10
+            if "exhaust_hand" in values or "exhaust_non_attack" in values:
+                gain += 50 * status_in_hand
+            if "heal_on_damage" in values:
+                gain += 12 * (player.max_hp - player.current_hp + damage)
+            if "gain_max_hp_on_kill" in values:
+                gain += 12 * values["gain_max_hp_on_kill"]
+            return damage_dealt, hp_lost, gain
+
+        damage_items = []
+        hp_items = []
+        gain_items = []
+        for card, values in zip(remaining_cards, all_values):
+            damage_dealt, hp_lost, gain = card_gains(values)
+            if "play_top_card" in values:
+                for top_card_gains in map(card_gains, havoc_values):
+                    damage_dealt = max(damage_dealt, top_card_gains[0])
+                    hp_lost = max(hp_lost, top_card_gains[1])
+                    gain = max(gain, top_card_gains[2])
+            # A played status or curse leaves the hand and stops being penalized
+            if card.type.name in ["STATUS", "CURSE"]:
+                gain += 30
+            damage_items.append((card.cost, damage_dealt * duplication))
+            hp_items.append((card.cost, hp_lost * duplication))
+            gain_items.append((card.cost, gain * duplication))
+
+        bound = eval
+        bound += 32 * max(0, incoming_damage)
+        bound += 700 * (max_strength - strength)
+        bound += 9 * fractional_knapsack(damage_items, remaining_energy)
+        bound += fractional_knapsack(gain_items, remaining_energy)
+
+        # Monster hp can't go lower than zero, kills are granted to the weakest monsters first. Juggernaut ignores block
+        max_hp_lost = fractional_knapsack(hp_items, remaining_energy)
+        bound += min(max_hp_lost, sum(monster.current_hp for monster in alive_monsters))
+
+        def kill_cost(monster):
+            if extra_hp_loss:
+                return 0
+            if juggernaut:
+                return monster.current_hp
+            return monster.current_hp + monster.block
+
+        killable = 0
+        for monster in sorted(alive_monsters, key=kill_cost):
+            if kill_cost(monster) > max_hp_lost:
+                break
+            max_hp_lost -= kill_cost(monster)
+            killable += 1
+        kill_gains = sorted(
+            (
+                1000
+                + 100 * max(0, monster.power_amount("Strength"))
+                for monster in alive_monsters
+            ),
+            reverse=True,
+        )
+        bound += sum(kill_gains[:killable])
+        if killable > 0 and (
+            killable == len(alive_monsters)
+            or any(
+                monster.monster_index in context.leader_indexes
+                for monster in alive_monsters
+            )
+        ):
+            bound += 30000
+
+        # Powers already in play are worth 100 more once the incoming damage drops to 5 or less
+        bound += 100 * sum(
+            1
+            for power in player.powers
+            if power.power_name
+            in [
+                "Demon Form",
+                "Corruption",
+                "Juggernaut",
+                "Dark Embrace",
+                "Feel No Pain",
+                "Barricade",
+                "Berserk",
+            ]
+        )
+
+        # evaluate_state flips between -6000 and +10000 for an exhausted Feed depending on the last simulated Feed
+        feed_count = sum(1 for card in game_state.exhaust_pile if card.card_id == "Feed")
+        feed_count += sum(1 for card in remaining_cards if card.card_id == "Feed")
+        bound += 16000 * feed_count
+
+        return bound
+
     def expectimax(self):
         """This is where everything happens, the return of the algorithm is the action the agent is going to take.
         There is a notable computational expense here. This function calculates the best possible combination of cards up to the available energy but only returns the first card.
         This is done because the game is so unpredictable with card combinations, relics, draws, powers, enemy abilites, the randomness of the game that cant be replicated without cheating and so much more,
         that the best action is to simulate the best combo, find it and return its first card. 9/10 the resulting 2-3 itterations will return the exact same combo but i found out that it is worth the effort.
+        The combinations are explored depth first, every sequence is simulated once on top of the state of its prefix and a branch stops as soon as the
+        remaining energy can't pay for the next card. Ties are resolved exactly like the old permutation loop did: longer sequences win and between sequences
+        of the same length the last one explored wins.
+        The search is iterative deepening: combos of 1 card, then up to 2 cards and so on up to self.initial_depth. When self.decision_time_limit runs out
+        the best action of the last completed depth is returned, the completed depth is kept in self.completed_depth.
+        With self.parallel_search the subtree of every first card is explored by a worker of the search pool, see parallel_search_depth.
         """
 
-        def get_partial_combination_key(partial_combo):
-            return tuple((card.card_id, card.cost) for card in partial_combo)
-
-        best_action = (None, None)
         best_game_state = None
-        duplication_power = False
+        deadline = None
+        if self.decision_time_limit is not None:
+            deadline = time.monotonic() + self.decision_time_limit
 
-        # We init the cache
-        cache = GameStateCache()
+        # Built before the first copy so every simulated state shares it
+        get_combat_context(self.game)
 
-        # Copying the gamestate is important because we are going to perform a lot of simulations that will alter the original gamestate if not copied
-        starting_state = copy.deepcopy(self.game)
+        # Evals of an earlier decision can't be reused, the relics or the room may have changed since
+        self.evaluation_cache.clear()
 
-        # This is a safety messure, all it does it check if the resulting eval is better than the eval we started with. If not do nothing
-        starting_state.player.current_hp -= max(
-            0, self.get_incoming_damage(starting_state)
+        # This is a safety messure, all it does it check if the resulting eval is better than the eval we started with. If not do nothing.
+        # Doing nothing takes the incoming damage on top of the one evaluate_state takes
+        starting_eval = self.evaluate_state(
+            self.game, hp_loss=max(0, self.get_incoming_damage(self.game))
         )
-        max_eval = self.evaluate_state(starting_state)
 
         # These are all our cards
         playable_cards = self.init_playable_cards(self.game)
+        self.set_real_costs(self.game, playable_cards)
+
+        # Small hands are searched faster than the workers can be sent the game state.
+        # Feed changes self.feed_effect_used, which the evaluation of the following subtrees reads, so its subtrees can't be explored apart
+        parallel = (
+            self.parallel_search
+            and len(playable_cards) >= self.parallel_min_cards
+            and not any(card.card_id == "Feed" for card in playable_cards)
+        )
+        if parallel:
+            payload = pickle.dumps((self, playable_cards))
 
-        available_energy = self.game.player.energy
+        self.completed_depth = 0
+        completed_result = SearchResult(starting_eval)
 
-        # This run for ALL possible compinations
-        for r in range(1, len(playable_cards) + 1):
-            for combo in itertools.permutations(playable_cards, r):
-                total_cost = 0
-                first_card_target = None
-                is_first_card = True
+        for max_depth in range(1, min(self.initial_depth, len(playable_cards)) + 1):
+            # States already explored by this depth of the search, the hits are subtrees we don't have to simulate again
+            self.transposition_table.clear()
+            result = SearchResult(starting_eval, self.transposition_table)
 
-                # Calculate the cost of the combo and skip if it exceeds energy
-                for card in combo:
-                    for power in self.game.player.powers:
-                        if (
-                            power.power_name == "Corruption"
-                            and card.type.name == "SKILL"
-                        ):
-                            card.exhausts = True
-                            card.cost = 0
-                        if power.power_id == "DuplicationPower":
-                            duplication_power = True
-                    if card.cost == -1:
-                        card.cost = available_energy
-                    if card.cost == -2:
-                        card.cost = 0
-                    total_cost += card.cost
-
-                if total_cost > available_energy:
-                    continue
+            try:
+                if parallel:
+                    self.parallel_search_depth(
+                        result, payload, playable_cards, max_depth, deadline
+                    )
+                else:
+                    self.search_depth(
+                        result, self.game, playable_cards, max_depth, deadline
+                    )
+            except SearchTimeout:
+                logging.info(f"Search ran out of time at depth {max_depth}")
+                # If not even the single card plays could be explored we settle for the best one found so far
+                if self.completed_depth == 0:
+                    completed_result = result
+                break
+
+            completed_result = result
+            self.completed_depth = max_depth
+
+            # No combo was cut by the depth, the deeper searches would find nothing new
+            if not result.depth_limited:
+                break
+
+        max_eval = completed_result.max_eval
+        best_action = completed_result.best_action
+        self.principal_variation = [
+            playable_cards[i] for i in completed_result.best_line
+        ]
 
-                # Again we copy the original game_state
-                current_state = copy.deepcopy(self.game)
+        logging.info(
+            f"Completed depth {self.completed_depth}. Transposition table: {self.transposition_table.get_stats()}. "
+            f"Evaluations: {self.evaluation_cache.get_stats()}"
+        )
 
-                # This is the position the loop is going to simulate if it finds a combo that is partially cached. For example:
-                # Lets assume we have this combo of 3 cards:
-                # [Strike, Strike, Defend]
-                # If we have alreay played and cached the combo [Strike, Strike], the cache is going to return its game_state, its eval and the target of the first card.
-                # Then we will simulate on top of that the play of Defend and return the eval.
-                # !!!NOTE!!!
-                # The combinations [Strike,Strike,Defend] and [Strike,Defend,Strike] are not and should not be treated as the same.
-                skip_to_position = 0
+        if best_action[0] is not None:
+            best_game_state = self.simulate_card_play(
+                self.game.clone_for_simulation(), best_action[0], best_action[1]
+            )
 
-                for i, card in enumerate(combo):
-                    partial_combo_key = get_partial_combination_key(combo[: i + 1])
+        return max_eval, best_action, best_game_state
 
-                    cached_state, cached_target, cached_eval = cache.get_state(
-                        partial_combo_key
-                    )
-                    if cached_state:
-                        current_state = cached_state
-                        eval = cached_eval
-                        if is_first_card and i == 0:
-                            first_card_target = cached_target
-                            is_first_card = False
-                        skip_to_position = i + 1
-                    else:
-                        break
+    def set_real_costs(self, game_state, cards):
+        """The real cost of every card is known before the search starts, X cost cards use all of our energy"""
+        has_corruption = any(
+            power.power_name == "Corruption" for power in game_state.player.powers
+        )
+        for card in cards:
+            if has_corruption and card.type.name == "SKILL":
+                card.exhausts = True
+                card.cost = 0
+            if card.cost == -1:
+                card.cost = game_state.player.energy
+            if card.cost == -2:
+                card.cost = 0
+
+    def search_depth(
+        self, result, root_state, playable_cards, max_depth, deadline, root_index=None
+    ):
+        """Explores every combo of at most max_depth cards from root_state and keeps the best one in result.
+        With root_index only the combos starting with that card are explored, this is the work of one worker of the search pool
+        """
+        available_energy = root_state.player.energy
+        duplication_power = root_state.player.get_power("DuplicationPower") is not None
 
-                # Start simulating from the first uncached position in the combo
-                for i in range(skip_to_position, len(combo)):
-                    card = combo[i]
-                    target = None
+        # With array_search the cards are played on copies of CombatArrays, the evaluation and the transposition keys still read the
+        # game state the arrays are converted back to. NumPy is only imported for it
+        root_arrays = None
+        if self.array_search:
+            from spirecomm.ai import combat_arrays
 
-                    # If card requires target, evaluate with all targets
-                    if card.has_target or card.card_id in ["Sword Boomerang"]:
+            if (
+                combat_arrays.get_search_unsupported_reason(root_state, playable_cards)
+                is None
+            ):
+                root_arrays = combat_arrays.CombatArrays.from_game(root_state)
+        undo_simulation = self.undo_simulation and root_arrays is None
+        in_sequence = [False] * len(playable_cards)
 
-                        # Find the best target
-                        target = self.get_best_target(current_state)
+        # Copies of a card are interchangeable, a hand is a multiset of these
+        card_classes = [
+            (card.card_id, card.upgrades, card.cost) for card in playable_cards
+        ]
 
-                        # We have to store the first card's target here as well
-                        if is_first_card:
-                            first_card_target = target
-                            is_first_card = False
+        # Transposition keys of the states on the way to the current one, see parallel_search_depth, and the cards played to get there
+        path = []
+        line = []
 
-                    # Simulate the game_state
-                    current_state = self.simulate_card_play(current_state, card, target)
+        def update_best(eval, depth, first_card, first_card_target, i):
+            """Same rule as the old permutation loop, a higher eval wins and ties go to the longest and then the last combo"""
+            if eval > result.max_eval or (
+                eval == result.max_eval and depth + 1 >= result.best_depth
+            ):
+                if eval > result.max_eval or depth + 1 > result.best_depth:
+                    result.best_combos = []
+                result.max_eval = eval
+                result.best_depth = depth + 1
+                result.best_action = (first_card, first_card_target)
+                result.best_line = (*line, i)
+                result.best_combos.append((tuple(path), result.best_line))
+
+        def search(
+            current_state,
+            remaining_energy,
+            depth,
+            first_card,
+            first_card_target,
+            current_arrays=None,
+        ):
+            """Extends the sequence that led to current_state by one card at a time and keeps the best one found. Returns the best eval of the subtree.
+            current_arrays is current_state as CombatArrays with array_search
+            """
+            subtree_eval = float("-inf")
 
-                    # This is a power that lets us play the same card twice
-                    if duplication_power:
-                        current_state = self.simulate_card_play(
-                            current_state, card, target
-                        )
-                        duplication_power = False
-
-                    # Evaluate the simulated_state
-                    eval = self.evaluate_state(current_state)
-
-                    # Store the new state and target in the cache
-                    partial_combo_key = get_partial_combination_key(combo[: i + 1])
-                    cache.store_state(
-                        partial_combo_key,
-                        current_state,
-                        target,
-                        eval,
+            # Eval of the state reached by playing the first copy of every card from current_state
+            class_evals = {}
+
+            for i, card in enumerate(playable_cards):
+                if in_sequence[i] or card.cost > remaining_energy:
+                    continue
+                if depth == 0 and root_index is not None and i != root_index:
+                    continue
+
+                if deadline is not None and time.monotonic() > deadline:
+                    raise SearchTimeout()
+
+                target = None
+
+                # If card requires target, evaluate with all targets
+                if card.has_target or card.card_id in ["Sword Boomerang"]:
+                    target = self.get_best_target(current_state)
+
+                if depth == 0:
+                    first_card, first_card_target = card, target
+
+                # Another copy of this card was already played from this state, it reaches the same state so its subtree is the same too.
+                # Only the tie breaking can still pick this copy
+                if card_classes[i] in class_evals:
+                    update_best(
+                        class_evals[card_classes[i]],
+                        depth,
+                        first_card,
+                        first_card_target,
+                        i,
                     )
+                    continue
+
+                # Simulate the game_state, the state of the prefix is shared by all of its children so it must stay untouched.
+                # With undo_simulation the card is played on the shared state and the changes are rolled back once its subtree is explored
+                next_arrays = None
+                if current_arrays is not None:
+                    next_arrays = combat_arrays.play_card(
+                        current_arrays.copy(), card, target
+                    )
+                elif undo_simulation:
+                    mark = undo_log.mark()
+                    next_state = self.simulate_card_play(current_state, card, target)
+                else:
+                    next_state = self.simulate_card_play(
+                        current_state.clone_for_simulation(), card, target
+                    )
+
+                # This is a power that lets us play the next card twice, only the first card of the sequence
+                if duplication_power and depth == 0:
+                    if next_arrays is not None:
+                        combat_arrays.play_card(next_arrays, card, target)
+                    else:
+                        next_state = self.simulate_card_play(next_state, card, target)
+                if next_arrays is not None:
+                    next_state = next_arrays.to_game()
+
+                # Evaluate the simulated_state
+                eval = self.evaluate_state(next_state)
+
+                subtree_eval = max(subtree_eval, eval)
+                class_evals[card_classes[i]] = eval
+                if depth == 0:
+                    result.first_card_eval = eval
 
                 # Update best action if this evaluation is higher
-                if eval >= max_eval:
-                    max_eval = eval
-                    best_action = (combo[0], first_card_target)
-                    best_game_state = copy.deepcopy(self.game)
-                    best_game_state = self.simulate_card_play(
-                        best_game_state, combo[0], first_card_target
+                update_best(eval, depth, first_card, first_card_target, i)
+
+                # Another order of the same cards already got here, everything below this state has been explored
+                state_key = (
+                    depth,
+                    GameStateCache.get_key(next_state, remaining_energy - card.cost),
+                )
+                explored_eval = result.table.get_state(state_key)
+                if explored_eval is not None:
+                    subtree_eval = max(subtree_eval, explored_eval)
+                else:
+                    result.table.store_state(state_key, eval)
+
+                    remaining_cards = [
+                        each_card
+                        for j, each_card in enumerate(playable_cards)
+                        if not in_sequence[j]
+                        and j != i
+                        and each_card.cost <= remaining_energy - card.cost
+                    ]
+                    bound = self.get_optimistic_bound(
+                        next_state, eval, remaining_cards, remaining_energy - card.cost
                     )
 
-        return max_eval, best_action, best_game_state
+                    if remaining_cards and depth + 1 >= max_depth:
+                        result.depth_limited = True
+                    # Nothing below this state can beat the best combo, ties still have to be explored because longer combos win them
+                    elif bound >= result.max_eval or self.verify_bound:
+                        in_sequence[i] = True
+                        path.append(state_key)
+                        line.append(i)
+                        children_eval = search(
+                            next_state,
+                            remaining_energy - card.cost,
+                            depth + 1,
+                            first_card,
+                            first_card_target,
+                            next_arrays,
+                        )
+                        path.pop()
+                        line.pop()
+                        in_sequence[i] = False
+
+                        if self.verify_bound:
+                            assert (
+                                bound >= children_eval
+                            ), f"Optimistic bound {bound} is lower than {children_eval} after {card.name}"
+                        subtree_eval = max(subtree_eval, children_eval)
+                        result.table.store_state(
+                            state_key, max(eval, children_eval)
+                        )
+
+                if undo_simulation:
+                    undo_log.undo(mark)
+
+            return subtree_eval
+
+        # Only the combat sections are copied, with verify_shared_sections the search checks it never changed the shared ones
+        simulation_root = root_state.clone_for_simulation(self.verify_shared_sections)
+        start_running_totals(simulation_root)
+        if undo_simulation:
+            with UndoLog() as undo_log:
+                search(simulation_root, available_energy, 0, None, None)
+        else:
+            search(simulation_root, available_energy, 0, None, None, root_arrays)
+
+        if self.verify_shared_sections:
+            simulation_root.assert_shared_unchanged()
+
+    def parallel_search_depth(self, result, payload, playable_cards, max_depth, deadline):
+        """Splits the root of the search by first card across the search pool and merges the best combo of every subtree into result.
+        The subtrees don't share a transposition table, so for the result to be exactly the one of the sequential search a combo only counts
+        when none of the states on its way were explored by an earlier subtree: the sequential search would have found them in the table and skipped them.
+        The keys of a subtree's table are the states it explored, so the tables of the workers never evict. An evicted key would let a later
+        subtree win with a combo the sequential search skipped. A worker's table only holds one subtree of one depth, the memory_budget
+        of the agent's own table still bounds the sequential search
+        """
+        pool = self.get_search_pool()
+        root_indexes = [
+            i
+            for i, card in enumerate(playable_cards)
+            if card.cost <= self.game.player.energy
+        ]
+
+        # Only the first copy of every card gets a subtree, see search_depth
+        first_copies = {}
+        for root_index in root_indexes:
+            card = playable_cards[root_index]
+            card_class = (card.card_id, card.upgrades, card.cost)
+            first_copies.setdefault(card_class, root_index)
+        futures = {
+            root_index: pool.submit(
+                search_root_subtree,
+                payload,
+                root_index,
+                max_depth,
+                result.max_eval,
+                deadline,
+            )
+            for root_index in first_copies.values()
+        }
+
+        explored = set()
+        for root_index in root_indexes:
+            card = playable_cards[root_index]
+            first_copy = first_copies[(card.card_id, card.upgrades, card.cost)]
+            if first_copy != root_index:
+                # A later copy only reaches the state of the first one, it can still win the tie breaking on its own
+                subtree = SearchResult(result.max_eval)
+                subtree.max_eval = futures[first_copy].result().first_card_eval
+                subtree.best_depth = 1
+                subtree.best_combos = [((), (root_index,))]
+            else:
+                subtree = futures[root_index].result()
+            result.depth_limited = result.depth_limited or subtree.depth_limited
+            result.table.hits += subtree.table.hits
+            result.table.misses += subtree.table.misses
+            result.table.evictions += subtree.table.evictions
+
+            # Same rule as the sequential search, the last subtree reaching the best eval at the longest length wins
+            if subtree.best_combos and (
+                subtree.max_eval > result.max_eval
+                or (
+                    subtree.max_eval == result.max_eval
+                    and subtree.best_depth >= result.best_depth
+                )
+            ):
+                best_line = next(
+                    (
+                        line
+                        for path, line in reversed(subtree.best_combos)
+                        if explored.isdisjoint(path)
+                    ),
+                    None,
+                )
+                if best_line is not None:
+                    target = None
+                    if card.has_target or card.card_id in ["Sword Boomerang"]:
+                        target = self.get_best_target(self.game)
+                    result.max_eval = subtree.max_eval
+                    result.best_depth = subtree.best_depth
+                    result.best_action = (card, target)
+                    result.best_line = best_line
+
+            explored.update(subtree.table.cache)
+
+    def get_search_pool(self):
+        """The worker processes are started once and kept for the whole run"""
+        if self.search_pool is None:
+            self.search_pool = ProcessPoolExecutor(max_workers=self.search_workers)
+        return self.search_pool
 
     def get_play_card_action(self):
-        """ Calls expectimax and returns EndTurn if no better action was found or if an error occured"""
+        """ Plays the next card of the planned combo when the game went as simulated, otherwise calls expectimax. Returns EndTurn if no better action was found or if an error occured"""
+
+        planned_action = self.follow_plan()
+        if planned_action is not None:
+            return planned_action
 
         best_eval, best_action, best_game_state = self.expectimax()
 
+        # The rest of the combo is played without searching again as long as the game matches the simulation
+        self.plan = self.principal_variation[1:]
+        self.plan_card = best_action[0]
+        self.plan_state = best_game_state
+        self.plan_eval = best_eval
+
         if best_action:
             return (
                 best_action,
@@ -603,153 +1242,97 @@ class SimpleAgent:
         else:
             return EndTurnAction()
 
-    def simulate_card_play(self, simulated_state, card, target=None):
-        """Attempts a modest simulation of the game_state when playing a card. Optimizing the agent to make better decisions means making the simulation as accurate as possible.
-        This is so complicated that there are bound to be unfound bugs possibly bypassed because of the single card play 
+    def follow_plan(self):
+        """Returns the next card of the combo found by the last search if the previous card was played and the game is in the state the simulation
+        predicted, None when a new search is needed
         """
+        if not self.plan or self.plan_state is None:
+            return None
 
-        def apply_exhaust_effects(game_state, card):
-            """Applies effects of powers when exhausting a card
-            Relics are random and cant be possibly predicted without cheating and drawing from the draw pile is also random so keep that in mind
-            """
-            card_values = get_card_values(card.name)
-            for power in game_state.player.powers:
-                if power.power_name == "Dark Embrace":
-                    game_state.player.draw(power.amount)
-                if power.power_name == "Feel No Pain":
-                    game_state.player.block += power.amount
-            if "gain_energy_on_exhaust" in card_values:
-                game_state.player.energy += card_values["gain_energy_on_exhaust"]
-            game_state.exhaust_pile.append(card)
-
-        def deal_damage(card, game_state, target):
-            """Deals damage to a target, accounts for everything unless i have forgotten them or not seen them in my tests"""
-            card_values = get_card_values(card.name)
-
-            if card_values.get("damage", 0) <= 0 or target is None:
-                return 0
-
-            damage = card_values["damage"]
-
-            current_strength = next(
+        card = next(
+            (each_card for each_card in self.game.hand if each_card == self.plan[0]),
+            None,
+        )
+        if card is not None:
+            self.set_real_costs(self.game, [card])
+
+        if (
+            card is None
+            or not card.is_playable
+            or card.cost > self.game.player.energy
+            or self.plan_card in self.game.hand
+            or self.get_plan_key(self.game) != self.get_plan_key(self.plan_state)
+        ):
+            self.plan_misses += 1
+            self.plan = []
+            self.log_plan_hit_rate()
+            return None
+
+        self.plan_hits += 1
+        self.log_plan_hit_rate()
+        self.plan = self.plan[1:]
+
+        target = None
+        if card.has_target or card.card_id in ["Sword Boomerang"]:
+            target = self.get_best_target(self.game)
+
+        self.plan_card = card
+        self.plan_state = self.simulate_card_play(
+            self.game.clone_for_simulation(), card, target
+        )
+        return (card, target), self.plan_state, self.plan_eval
+
+    def get_plan_key(self, game_state):
+        """The part of a combat state the simulation models. The piles the played cards go to and the draws are left out, a drawn card still shows in the hand"""
+
+        def powers_key(powers):
+            return tuple(sorted((power.power_id, power.amount) for power in powers))
+
+        def pile_key(pile):
+            return tuple(sorted((card.card_id, card.upgrades) for card in pile))
+
+        player = game_state.player
+        return (
+            game_state.turn,
+            player.current_hp,
+            player.max_hp,
+            player.block,
+            player.energy,
+            powers_key(player.powers),
+            tuple(
                 (
-                    buff.amount
-                    for buff in game_state.player.powers
-                    if buff.power_id == "Strength"
-                ),
-                0,
-            )
-
-            # Adjust damage based on strength and weakened status
-            damage += current_strength
-
-            if "strength_multiplier" in card_values:
-                damage += max(1, current_strength) * card_values["strength_multiplier"]
-
-            # Check for Paper Frog relic, which increases the vulnerability effect to 75%
-            for relic in game_state.relics:
-                if relic.relic_id == "Akabeko" and game_state.turn == 0:
-                    damage += 8
-                if relic.relic_id == "Pen Nib" and relic.counter == 10:
-                    damage *= 2
-                if target.has_debuff("Vulnerable"):
-                    if relic.relic_id == "Paper Phrog":
-                        damage = int(damage * 1.75)
-                    else:
-                        damage = int(damage * 1.50)
-
-            if game_state.player.has_debuff("Weakened") == True:
-                damage = int(damage * 0.75)  # Reduce damage by 25% if weakened
-
-            game_state.damage_dealt += damage
-            for power in target.powers:
-                if power.power_id in ["Sharp Hide", "Thorns"]:
-                    game_state.instances_of_damage += 1
-
-            target.block -= damage
-
-            if target.block <= 0:
-                damage = abs(target.block)
-                target.block = 0
-            else:
-                return 0
-
-            target.current_hp -= damage
-
-            if target.current_hp <= 0:
-                damage += target.current_hp
-                if target.monster_id == "FungiBeast":
-                    game_state.player.add_buff("Vulnerable", target.powers[0].amount)
-            return damage
+                    monster.current_hp,
+                    monster.block,
+                    monster.is_gone,
+                    monster.move_adjusted_damage,
+                    powers_key(monster.powers),
+                )
+                for monster in game_state.monsters
+            ),
+            pile_key(game_state.hand),
+            pile_key(game_state.exhaust_pile),
+        )
 
-        def handle_enemy_powers(monster, card, damage, simulated_state):
-            """How the each enemy will interact with the play of a card.
-            Most enemies have a unique effect and a way to beat them so we mustaaccount for that and base our strategies around it
-            """
-            card_effects = get_card_values(card.name)
+    def get_plan_hit_rate(self):
+        """Share of the planned cards that could be played without a new search"""
+        checked = self.plan_hits + self.plan_misses
+        if checked == 0:
+            return 0.0
+        return self.plan_hits / checked
 
-            for power in monster.powers:
-                if power.power_id == "Curl Up" and damage > 0:
-                    monster.block += power.amount
-                    monster.powers = [
-                        p for p in monster.powers if p.power_id != "Curl Up"
-                    ]
-                if power.power_id == "Anger" and card.type.name == "SKILL":
-                    monster.add_buff("Strength", power.amount)
-                if power.power_id == "Angry" and damage > 0:
-                    monster.add_buff("Strength", power.amount)
-                if power.power_id == "Artifact":
-                    debuffs = ["Vulnerable", "Weakened"]  # List of debuffs
-                    for debuff in debuffs:
-                        if monster.has_debuff(debuff) and debuff in card_effects:
-                            if power.amount > 0:
-                                monster.remove_buff(debuff, card_effects[debuff])
-                if power.power_id == "Malleable":
-                    monster.block += power.amount
-                    power.amount += (
-                        1  # Malleable increases the amount of block each time
-                    )
-                if power.power_id == "Buffer" and damage > 0:
-                    monster.powers = [
-                        p for p in monster.powers if p.power_id != "Buffer"
-                    ]
-                    damage = 0
-                if power.power_id == "Invincible":
-                    if damage > monster.max_hp * 0.15:
-                        damage = monster.max_hp * 0.15  # Cap damage to 15% of max HP
-                if power.power_id == "Mode Shift":
-                    monster.current_hp = power.amount
-                if power.power_id == "Plated Armor" and damage > 0:
-                    if monster.block <= 0:
-                        power.amount -= (
-                            1  # Reduce Plated Armor by 1 for each unblocked attack
-                        )
-                        if power.amount <= 0:
-                            monster.powers = [
-                                p
-                                for p in monster.powers
-                                if p.power_id != "Plated Armor"
-                            ]
-                if power.power_id == "Flight":
-                    if power.amount <= 0:
-                        monster.move_adjusted_damage = 0
-                    else:
-                        damage /= 2
-                if power.power_id == "Split":
-                    monster.current_hp = monster.current_hp - int(monster.max_hp / 2)
+    def log_plan_hit_rate(self):
+        logging.info(
+            f"Plan reuse: {self.plan_hits} hits, {self.plan_misses} misses, hit rate {self.get_plan_hit_rate():.2f}"
+        )
 
-            return monster, simulated_state, damage
+    def simulate_card_play(self, simulated_state, card, target=None):
+        """Attempts a modest simulation of the game_state when playing a card. Optimizing the agent to make better decisions means making the simulation as accurate as possible.
+        This is so complicated that there are bound to be unfound bugs possibly bypassed because of the single card play 
+        The effects of the card come from its compiled program, see card_effects
+        """
 
         try:
-            damage = 0
-            block = 0
-            current_dexterity = 0
-            no_extra_damage = False
             simulated_state_target = None
-            has_torii = False
-            has_trod = False
-            has_intagible = False
-            is_frail = False
 
             if target is not None:
                 for each_monster in simulated_state.monsters:
@@ -760,220 +1343,36 @@ class SimpleAgent:
             if card in simulated_state.hand:
                 if card.cost > simulated_state.player.energy:
                     return simulated_state
+                record_list(simulated_state.hand)
+                record_list(simulated_state.played_cards)
                 simulated_state.hand.remove(card)
                 simulated_state.played_cards.append(card)
+                track_card_removed(simulated_state, card, "hand")
             else:
                 return simulated_state
 
-            card_values = get_card_values(card.name)
+            spec = card.spec
+            play = CardPlay(self, simulated_state, card, simulated_state_target)
 
             # Find player's dexterity and Frail status
-            for buff in simulated_state.player.powers:
-                if buff.power_id == "Dexterity":
-                    current_dexterity = buff.amount
-                if buff.power_id == "Frail":
-                    is_frail = True
-                if buff.power_id == "Intangible":
-                    has_intagible = True
-
-            for relic in simulated_state.relics:
-                if relic.name == "Torii":
-                    has_torii = True
-                if relic.name == "Tungsten Rod":
-                    has_trod = True
-
-            if "block" in card_values:
-                block = card_values["block"]
-
-                # Adjust block based on dexterity and frail status
-                if block != 0:
-                    block += current_dexterity
-                    if is_frail:
-                        block = int(block * 0.75)  # Frail reduces block by 25%
-                    simulated_state.player.block += block
-
-            # Other effects (vulnerable, weak, strength, etc.)
-            if "self_vulnerable" in card_values:
-                simulated_state.player.add_buff(
-                    "Vulnerable", card_values["self_vulnerable"]
-                )
-                simulated_state.player.add_buff("Berserk", card_values["gain_energy"])
-            if "weak" in card_values and simulated_state_target is not None:
-                simulated_state_target.add_buff("Weakened", card_values["weak"])
-            if "strength" in card_values:
-                simulated_state.player.add_buff("Strength", card_values["strength"])
-            if "draw" in card_values:
-                simulated_state.player.draw(card_values["draw"])
-                simulated_state.cards_drawn_this_turn += 1
-            if "draw_on_status" in card_values:
-                simulated_state.player.add_buff("Evolve", card_values["draw_on_status"])
-            if "gain_energy" in card_values:
-                simulated_state.player.gain_energy(card_values["gain_energy"])
-            if "lose_hp" in card_values:
-                lose_hp = card_values["lose_hp"]
-                if has_intagible:
-                    lose_hp = 1
-                if has_torii and lose_hp <= 5:
-                    lose_hp = 1
-                if has_trod:
-                    lose_hp -= 1
-                simulated_state.player.current_hp -= lose_hp
-            if "exhaust" in card_values:
-                apply_exhaust_effects(simulated_state, card)
-            if "aoe" in card_values:
-                for aoe_monster in simulated_state.monsters:
-                    no_extra_damage = True
-                    if aoe_monster.current_hp > 0 and not aoe_monster.is_gone:
-                        damage = deal_damage(card, simulated_state, aoe_monster)
-                        if "heal_on_damage" in card_values:
-                            simulated_state.player.current_hp = max(
-                                damage + simulated_state.player.current_hp,
-                                simulated_state.player.max_hp,
-                            )
-            if "exhaust_non_attack" in card_values:
-                block = 0
-                for each_card in simulated_state.hand:
-                    if each_card.type.name != "ATTACK" and each_card.uuid != card.uuid:
-                        block += card_values["block_per_exhaust"] + current_dexterity
-                        if is_frail:
-                            block = int(block * 0.75)  # Frail reduces block by 25%
-                        simulated_state.player.block += block
-                        apply_exhaust_effects(simulated_state, each_card)
-            if "based_on_block" in card_values:
-                card_values["damage"] = simulated_state.player.block
-                damage = deal_damage(card, simulated_state, aoe_monster)
-                no_extra_damage = True
-            if "play_top_card" in card_values:
-                if simulated_state.draw_pile:
-                    top_card = simulated_state.draw_pile.pop()
-                    simulated_state = self.simulate_card_play(
-                        simulated_state, top_card, simulated_state_target
-                    )
-            if "create_copy" in card_values:
-                simulated_state.hand.append(copy.deepcopy(card))
-            if "gain_block_on_exhaust" in card_values:
-                simulated_state.player.add_buff(
-                    "Feel No Pain", card_values["gain_block_on_exhaust"]
-                )
-            if "gain_strength_on_hp_loss" in card_values:
-                simulated_state.player.add_buff(
-                    "Rupture",
-                    card_values["gain_strength_on_hp_loss_from_playing_cards"],
-                )
-            if "exhaust_hand" in card_values:
-                simulated_state.exhaust_pile.extend(simulated_state.hand)
-                if "multiple_hits" in card_values:
-                    card_values["multiple_hits"] = len(simulated_state.hand) - 1
-                for each_card in simulated_state.hand:
-                    if card.uuid != each_card.uuid:
-                        apply_exhaust_effects(simulated_state, each_card)
-                simulated_state.hand.clear()
-            if "multiple_hits" in card_values and simulated_state_target is not None:
-                hits = card_values["multiple_hits"]
-                no_extra_damage = True
-                for _ in range(hits):
-                    if (
-                        simulated_state_target.current_hp > 0
-                        and not simulated_state_target.is_gone
-                    ):
-                        damage = deal_damage(
-                            card, simulated_state, simulated_state_target
-                        )
-            if "block_on_attack" in card_values:
-                block = card_values["block_on_attack"]
-                simulated_state.player.block += block
-            if "double_strength" in card_values:
-                for buff in simulated_state.player.powers:
-                    if buff.power_name == "Strength":
-                        buff.amount *= 2
-            if "damage_on_block" in card_values:
-                simulated_state.player.add_buff(
-                    "Juggernaut", card_values["damage_on_block"]
-                )
-            if "damage_on_attack" in card_values and simulated_state_target is not None:
-                simulated_state.player.add_buff(
-                    "Flame Barrier", card_values["damage_on_attack"]
-                )
-            if "double_block" in card_values:
-                simulated_state.player.block *= 2
-            if "draw_on_exhaust" in card_values:
-                simulated_state.player.add_buff(
-                    "Dark Embrace", card_values["draw_on_exhaust"]
-                )
-            if "give_power_per_turn" in card_values:
-                simulated_state.player.add_buff(
-                    "Demon Form", card_values["give_power_per_turn"]
-                )
-            if "block_never_expires" in card_values:
-                simulated_state.player.add_buff(
-                    "Barricade", card_values["block_never_expires"]
-                )
-            if "lose_hp_per_turn" in card_values:
-                simulated_state.player.add_buff(
-                    "Brutality", card_values["lose_hp_per_turn"]
-                )
-            if "skills_cost_zero" in card_values:
-                simulated_state.player.add_buff(
-                    "Corruption", card_values["skills_cost_zero"]
-                )
-            if "reduce_strength" in card_values and simulated_state_target is not None:
-                simulated_state_target.add_buff(
-                    "Strength", -card_values["reduce_strength"]
-                )
-            if "burns_to_draw" in card_values:
-                burn_card = Card(
-                    card_id="Burn",
-                    name="Burn",
-                    card_type=CardType(4),
-                    rarity="COMMON",
-                    cost=-1,
-                    is_playable=False,
-                )
-                simulated_state.draw_pile.append(burn_card)
-            if "add_wounds_to_hand" in card_values:
-                wound_card = Card(
-                    card_id="Wound",
-                    name="Wound",
-                    card_type=CardType(4),
-                    rarity="COMMON",
-                    cost=-2,
-                    is_playable=False,
-                )
-                simulated_state.hand.append(wound_card)
-                simulated_state.hand.append(wound_card)
-            if "sword_boomerang_handle" in card_values:
-                for i in range(card_values["hits"]):
-                    damage = deal_damage(card, simulated_state, simulated_state_target)
-                no_extra_damage = True
-            if "weak_aoe" in card_values:
-                for monster in simulated_state.monsters:
-                    monster.add_buff("Weakened", card_values["weak_aoe"])
-            if "vulnerable_aoe" in card_values:
-                for monster in simulated_state.monsters:
-                    monster.add_buff("Vulnerable", card_values["vulnerable_aoe"])
-            if "whirlwind_handle" in card_values:
-                while simulated_state.player.energy > 0:
-                    simulated_state.player.energy -= 1
-                    for aoe_monster in simulated_state.monsters:
-                        if aoe_monster.current_hp > 0 and aoe_monster.is_gone == False:
-                            damage = deal_damage(card, simulated_state, aoe_monster)
-                no_extra_damage = True
-            if (
-                "gain_max_hp_on_kill" in card_values
-                and simulated_state_target is not None
-            ):
-                feed_heal = card_values["gain_max_hp_on_kill"]
-                no_extra_damage = True
-                damage = deal_damage(card, simulated_state, simulated_state_target)
-
-                # Check if Feed will kill the target
-                if simulated_state_target.current_hp <= 0:
-                    # Simulate the kill and the HP gain
-                    simulated_state.player.max_hp += feed_heal
-                    simulated_state.player.current_hp += feed_heal
-                    self.feed_effect_used = True
-                else:
-                    self.feed_effect_used = False
+            player = simulated_state.player
+            play.current_dexterity = player.power_amount("Dexterity")
+            play.is_frail = player.get_power("Frail") is not None
+            play.has_intangible = player.get_power("Intangible") is not None
+
+            context = get_combat_context(simulated_state)
+            play.has_torii = context.has_torii
+            play.has_trod = context.has_trod
+
+            # Block, debuffs, draws, damage and everything else the card does
+            for effect in get_card_program(spec):
+                effect(play)
+
+            simulated_state = play.game_state
+            damage = play.damage
+            block = play.block
+            no_extra_damage = play.no_extra_damage
+            has_trod = play.has_trod
 
             for power in simulated_state.player.powers:
                 if power.power_name == "Juggernaut" and block > 0:
@@ -1003,15 +1402,15 @@ class SimpleAgent:
                     for temp_power in simulated_state.player.powers:
                         if temp_power.power_name == "Brutality":
                             simulated_state.player.add_buff("Strength", power.amount)
-                    if "lose_hp" in card_values:
+                    if spec.lose_hp:
                         simulated_state.player.add_buff("Strength", power.amount)
                 if power.power_name == "Brutality":
                     if not has_trod:
                         simulated_state.player.current_hp -= 1
 
             if simulated_state_target is not None:
-                simulated_state_target, simulated_state, damage = handle_enemy_powers(
-                    simulated_state_target, card, damage, simulated_state
+                damage = handle_enemy_powers(
+                    simulated_state_target, card, spec, damage
                 )
 
             if (
@@ -1021,95 +1420,91 @@ class SimpleAgent:
                 and not simulated_state_target.is_gone
             ):
                 # Calc damage to deal to target
-                damage = deal_damage(card, simulated_state, simulated_state_target)
+                damage = deal_damage(spec, simulated_state, simulated_state_target)
 
             simulated_state.player.energy -= max(0, card.cost)
 
             # vulnerable from cards like bash, Thunderclap and Uppercut gets added after the attack, not before
-            if "vulnerable" in card_values and simulated_state_target is not None:
-                simulated_state_target.add_buff("Vulnerable", card_values["vulnerable"])
+            if spec.vulnerable and simulated_state_target is not None:
+                simulated_state_target.add_buff("Vulnerable", spec.vulnerable)
 
             return simulated_state
         except Exception as e:
             logging.info(f"Error simulating card play: {e}")
             raise
 
-    def evaluate_state(self, game_state):
-        """Evaluation function of our agent, takes as input a gamestate and returns an integer that represents how good or bad the gamestate is"""
+    def evaluate_state(self, game_state, hp_loss=0):
+        """Evaluation function of our agent, takes as input a gamestate and returns an integer that represents how good or bad the gamestate is.
+        game_state is only read, the incoming damage is taken from a copy of the player's hp. hp_loss is lost on top of it, see expectimax.
+        States of a search are memoized by their hash in self.evaluation_cache, the hash covers everything read here that the simulation
+        changes. The Feed flag isn't part of the state so it is part of the key
+        """
+        running_totals = game_state.running_totals
+        if running_totals is None or self.verify_running_totals:
+            return self.compute_eval(game_state, hp_loss)
+
+        key = (running_totals.state_hash, self.feed_effect_used, hp_loss)
+        eval = self.evaluation_cache.get_state(key)
+        if eval is None:
+            eval = self.compute_eval(game_state, hp_loss)
+            self.evaluation_cache.store_state(key, eval)
+        return eval
+
+    def compute_eval(self, game_state, hp_loss):
+        """evaluate_state without the memoization"""
 
         eval = 0
-        all_monsters_dead = True
-        killed_special_monster = False
-        total_monster_hp = 0
 
         eval += game_state.cards_drawn_this_turn * 10
 
-        # Player Positive buffs
-        strength = next(
-            (
-                buff.amount
-                for buff in game_state.player.powers
-                if buff.power_id == "Strength"
-            ),
-            0,
-        )
-        dexterity = next(
-            (
-                buff.amount
-                for buff in game_state.player.powers
-                if buff.power_id == "Dexterity"
-            ),
-            0,
-        )
-        vulnerable = next(
-            (
-                debuff.amount
-                for debuff in game_state.player.powers
-                if debuff.power_id == "Vulnerable"
-            ),
-            0,
-        )
-
-        eval += strength * 700
-        eval += dexterity * 200
-        eval -= vulnerable * 75
-
-        for monster in game_state.monsters:
-            if monster.current_hp <= 0 or monster.is_gone == True:
-                eval += 1000  # Reward for killing an enemy
-                if monster.name in ["Reptomancer", "The Collector", "Gremlin Leader"]:
-                    killed_special_monster = True
-            else:
-
-                total_monster_hp += monster.current_hp
-
-                # Monster buffs
-                for debuff in monster.powers:
-                    if debuff.power_id == "Vulnerable":
-                        eval += 100 * debuff.amount
-                    if debuff.power_id == "Weakened":
-                        eval += 100 * debuff.amount
-                    if debuff.power_id == "Strength":
-                        eval -= 100 * debuff.amount
-
-                all_monsters_dead = False
+        # The simulation keeps these terms up to date during a search, other states are counted here.
+        # With verify_running_totals every node checks the running totals and the state hash against a full count
+        if game_state.running_totals is None:
+            terms = count_running_terms(game_state)
+        else:
+            terms = game_state.running_totals.get_terms()
+            if self.verify_running_totals:
+                counted_terms = count_running_terms(game_state)
+                assert (
+                    terms == counted_terms
+                ), f"Running totals {terms} differ from the count {counted_terms}"
+                state_hash = get_state_hash(game_state)
+                assert (
+                    game_state.running_totals.state_hash == state_hash
+                ), f"Running state hash {game_state.running_totals.state_hash} differs from the hash {state_hash}"
+        (
+            score,
+            alive_monsters,
+            killed_leaders,
+            _,
+            _,
+            count_status_curse_cards,
+            exhaust_score,
+            exhausted_feeds,
+        ) = terms
+        all_monsters_dead = alive_monsters == 0
+        killed_special_monster = killed_leaders > 0
+
+        # Strength, dexterity and vulnerable of the player, 1000 per monster killed,
+        # the debuffs and strength of the monsters alive minus their hp
+        eval += score
 
         eval += game_state.damage_dealt * 9
 
-        eval -= total_monster_hp
-
         incoming_damage = self.get_incoming_damage(game_state)
 
         # Winning the fight
         if all_monsters_dead == True or killed_special_monster:
             eval += 30000
         else:
-            game_state.player.current_hp -= max(0, incoming_damage)
+            current_hp = (
+                game_state.player.current_hp - hp_loss - max(0, incoming_damage)
+            )
 
-            if game_state.player.current_hp <= 0:
+            if current_hp <= 0:
                 return -1000000  # Strongly penalize if the player is dead
 
-            eval += game_state.player.current_hp * 12
+            eval += current_hp * 12
 
         if incoming_damage > 0:
             eval -= incoming_damage * 20
@@ -1117,23 +1512,13 @@ class SimpleAgent:
             eval -= (abs(incoming_damage) - 10) * 3
 
         # Reward for exhausting Curses but penalize exhausting good cards
-        for card in game_state.exhaust_pile:
-            if card.type.name in ["STATUS", "CURSE"]:
-                eval += 20
-            else:
-                if card.card_id not in ["Defend_R", "Attack_R"]:
-                    eval -= 5
-                if card.card_id == "Feed" and not self.feed_effect_used:
-                    eval -= 6000
-                elif card.card_id == "Feed" and self.feed_effect_used:
-                    eval += 10000
+        eval += exhaust_score
+        if self.feed_effect_used:
+            eval += 10000 * exhausted_feeds
+        else:
+            eval -= 6000 * exhausted_feeds
 
         # Penalty for status and curse cards in hand, discard pile, and draw pile
-        count_status_curse_cards = sum(
-            1
-            for card in game_state.hand + game_state.discard_pile + game_state.draw_pile
-            if card.type.name in ["STATUS", "CURSE"]
-        )
         eval -= 30 * count_status_curse_cards
 
         for power in game_state.player.powers:
@@ -1159,9 +1544,10 @@ class SimpleAgent:
     def play_all_static_potions(self, gamestate):
         """Static potions are all potions that have either a permanent effect or a semi-permanent one that lasts throught the battle. This handles when to play these potions"""
 
+        # The state doesn't change while the potions are looked at
+        incoming_damage = self.get_incoming_damage(gamestate)
         for potion in gamestate.get_static_potions():
             if potion.can_use:
-                incoming_damage = self.get_incoming_damage(gamestate)
                 target = self.get_best_target(gamestate)
 
                 if potion.name in [
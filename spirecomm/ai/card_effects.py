@@ -0,0 +1,472 @@
+import copy
+from card_dictionary import card_specs
+from spirecomm.ai.combat_context import get_combat_context
+from spirecomm.ai.running_totals import (
+    track_card_added,
+    track_card_exhausted,
+    track_card_removed,
+)
+from spirecomm.spire.card import Card, CardType
+from spirecomm.spire.undo import record_list
+
+
+class CardPlay:
+    """Everything the effects of a card read and change while it is being simulated"""
+
+    def __init__(self, agent, game_state, card, target):
+        self.agent = agent
+        self.game_state = game_state
+        self.card = card
+        self.spec = card.spec
+        self.target = target
+        self.damage = 0
+        # Fiend Fire hits once per exhausted card, the spec can't be changed so the count is kept here
+        self.hits = card.spec.multiple_hits
+        self.block = 0
+        self.current_dexterity = 0
+        self.is_frail = False
+        self.has_intangible = False
+        self.has_torii = False
+        self.has_trod = False
+        self.no_extra_damage = False
+
+
+def apply_exhaust_effects(game_state, card):
+    """Applies effects of powers when exhausting a card
+    Relics are random and cant be possibly predicted without cheating and drawing from the draw pile is also random so keep that in mind
+    """
+    for power in game_state.player.powers:
+        if power.power_name == "Dark Embrace":
+            game_state.player.draw(power.amount)
+        if power.power_name == "Feel No Pain":
+            game_state.player.block += power.amount
+    if "gain_energy_on_exhaust" in card.spec.values:
+        game_state.player.energy += card.spec.values["gain_energy_on_exhaust"]
+    record_list(game_state.exhaust_pile)
+    game_state.exhaust_pile.append(card)
+    track_card_exhausted(game_state, card)
+
+
+def deal_damage(spec, game_state, target, damage=None):
+    """Deals damage to a target, accounts for everything unless i have forgotten them or not seen them in my tests.
+    damage replaces the damage of the spec for cards like Body Slam
+    """
+    if damage is None:
+        damage = spec.damage
+    if damage <= 0 or target is None:
+        return 0
+
+    current_strength = game_state.player.power_amount("Strength")
+
+    # Adjust damage based on strength and weakened status
+    damage += current_strength
+
+    if spec.strength_multiplier:
+        damage += max(1, current_strength) * spec.strength_multiplier
+
+    # Check for Paper Frog relic, which increases the vulnerability effect to 75%
+    context = get_combat_context(game_state)
+    vulnerable = target.has_debuff("Vulnerable")
+    if vulnerable or context.has_damage_relics:
+        for relic_id in context.damage_relics:
+            if relic_id == "Akabeko" and game_state.turn == 0:
+                damage += 8
+            if relic_id == "Pen Nib":
+                damage *= 2
+            if vulnerable:
+                if relic_id == "Paper Phrog":
+                    damage = int(damage * 1.75)
+                else:
+                    damage = int(damage * 1.50)
+
+    if game_state.player.has_debuff("Weakened") == True:
+        damage = int(damage * 0.75)  # Reduce damage by 25% if weakened
+
+    game_state.damage_dealt += damage
+    for power in target.powers:
+        if power.power_id in ["Sharp Hide", "Thorns"]:
+            game_state.instances_of_damage += 1
+
+    target.block -= damage
+
+    if target.block <= 0:
+        damage = abs(target.block)
+        target.block = 0
+    else:
+        return 0
+
+    target.current_hp -= damage
+
+    if target.current_hp <= 0:
+        damage += target.current_hp
+        if target.monster_id == "FungiBeast":
+            game_state.player.add_buff("Vulnerable", target.powers[0].amount)
+    return damage
+
+
+def handle_enemy_powers(monster, card, spec, damage):
+    """How the each enemy will interact with the play of a card.
+    Most enemies have a unique effect and a way to beat them so we mustaaccount for that and base our strategies around it
+    """
+    for power in monster.powers:
+        if power.power_id == "Curl Up" and damage > 0:
+            monster.block += power.amount
+            monster.powers = [p for p in monster.powers if p.power_id != "Curl Up"]
+        if power.power_id == "Anger" and card.type.name == "SKILL":
+            monster.add_buff("Strength", power.amount)
+        if power.power_id == "Angry" and damage > 0:
+            monster.add_buff("Strength", power.amount)
+        if power.power_id == "Artifact":
+            debuffs = ["Vulnerable", "Weakened"]  # List of debuffs
+            for debuff in debuffs:
+                if monster.has_debuff(debuff) and debuff in spec.values:
+                    if power.amount > 0:
+                        monster.remove_buff(debuff, spec.values[debuff])
+        if power.power_id == "Malleable":
+            monster.block += power.amount
+            power.amount += 1  # Malleable increases the amount of block each time
+        if power.power_id == "Buffer" and damage > 0:
+            monster.powers = [p for p in monster.powers if p.power_id != "Buffer"]
+            damage = 0
+        if power.power_id == "Invincible":
+            if damage > monster.max_hp * 0.15:
+                damage = monster.max_hp * 0.15  # Cap damage to 15% of max HP
+        if power.power_id == "Mode Shift":
+            monster.current_hp = power.amount
+        if power.power_id == "Plated Armor" and damage > 0:
+            if monster.block <= 0:
+                power.amount -= 1  # Reduce Plated Armor by 1 for each unblocked attack
+                if power.amount <= 0:
+                    monster.powers = [
+                        p for p in monster.powers if p.power_id != "Plated Armor"
+                    ]
+        if power.power_id == "Flight":
+            if power.amount <= 0:
+                monster.move_adjusted_damage = 0
+            else:
+                damage /= 2
+        if power.power_id == "Split":
+            monster.current_hp = monster.current_hp - int(monster.max_hp / 2)
+
+    return damage
+
+
+def gain_block(play):
+    play.block = play.spec.block
+
+    # Adjust block based on dexterity and frail status
+    if play.block != 0:
+        play.block += play.current_dexterity
+        if play.is_frail:
+            play.block = int(play.block * 0.75)  # Frail reduces block by 25%
+        play.game_state.player.block += play.block
+
+
+def self_vulnerable(play):
+    play.game_state.player.add_buff("Vulnerable", play.spec.values["self_vulnerable"])
+    play.game_state.player.add_buff("Berserk", play.spec.gain_energy)
+
+
+def weaken_target(play):
+    if play.target is not None:
+        play.target.add_buff("Weakened", play.spec.weak)
+
+
+def gain_strength(play):
+    play.game_state.player.add_buff("Strength", play.spec.strength)
+
+
+def draw(play):
+    play.game_state.player.draw(play.spec.draw)
+    play.game_state.cards_drawn_this_turn += 1
+
+
+def draw_on_status(play):
+    play.game_state.player.add_buff("Evolve", play.spec.values["draw_on_status"])
+
+
+def gain_energy(play):
+    play.game_state.player.gain_energy(play.spec.gain_energy)
+
+
+def lose_hp(play):
+    lose_hp = play.spec.lose_hp
+    if play.has_intangible:
+        lose_hp = 1
+    if play.has_torii and lose_hp <= 5:
+        lose_hp = 1
+    if play.has_trod:
+        lose_hp -= 1
+    play.game_state.player.current_hp -= lose_hp
+
+
+def exhaust(play):
+    apply_exhaust_effects(play.game_state, play.card)
+
+
+def damage_all(play):
+    for aoe_monster in play.game_state.monsters:
+        play.no_extra_damage = True
+        if aoe_monster.current_hp > 0 and not aoe_monster.is_gone:
+            play.damage = deal_damage(play.spec, play.game_state, aoe_monster)
+            if "heal_on_damage" in play.spec.values:
+                play.game_state.player.current_hp = max(
+                    play.damage + play.game_state.player.current_hp,
+                    play.game_state.player.max_hp,
+                )
+
+
+def exhaust_non_attacks(play):
+    play.block = 0
+    for each_card in play.game_state.hand:
+        if each_card.type.name != "ATTACK" and each_card.uuid != play.card.uuid:
+            play.block += play.spec.values["block_per_exhaust"] + play.current_dexterity
+            if play.is_frail:
+                play.block = int(play.block * 0.75)  # Frail reduces block by 25%
+            play.game_state.player.block += play.block
+            apply_exhaust_effects(play.game_state, each_card)
+
+
+def damage_based_on_block(play):
+    play.damage = deal_damage(
+        play.spec, play.game_state, play.target, play.game_state.player.block
+    )
+    play.no_extra_damage = True
+
+
+def play_top_card(play):
+    if play.game_state.draw_pile:
+        record_list(play.game_state.draw_pile)
+        top_card = play.game_state.draw_pile.pop()
+        track_card_removed(play.game_state, top_card, "draw_pile")
+        play.game_state = play.agent.simulate_card_play(
+            play.game_state, top_card, play.target
+        )
+
+
+def create_copy(play):
+    record_list(play.game_state.hand)
+    play.game_state.hand.append(copy.deepcopy(play.card))
+    track_card_added(play.game_state, play.card, "hand")
+
+
+def gain_block_on_exhaust(play):
+    play.game_state.player.add_buff(
+        "Feel No Pain", play.spec.values["gain_block_on_exhaust"]
+    )
+
+
+def gain_strength_on_hp_loss(play):
+    play.game_state.player.add_buff(
+        "Rupture", play.spec.values["gain_strength_on_hp_loss_from_playing_cards"]
+    )
+
+
+def exhaust_hand(play):
+    record_list(play.game_state.exhaust_pile)
+    record_list(play.game_state.hand)
+    play.game_state.exhaust_pile.extend(play.game_state.hand)
+    for each_card in play.game_state.hand:
+        track_card_exhausted(play.game_state, each_card)
+    if "multiple_hits" in play.spec.values:
+        play.hits = len(play.game_state.hand) - 1
+    for each_card in play.game_state.hand:
+        if play.card.uuid != each_card.uuid:
+            apply_exhaust_effects(play.game_state, each_card)
+    for each_card in play.game_state.hand:
+        track_card_removed(play.game_state, each_card, "hand")
+    play.game_state.hand.clear()
+
+
+def multiple_hits(play):
+    if play.target is not None:
+        play.no_extra_damage = True
+        for _ in range(play.hits):
+            if play.target.current_hp > 0 and not play.target.is_gone:
+                play.damage = deal_damage(
+                    play.spec, play.game_state, play.target
+                )
+
+
+def block_on_attack(play):
+    play.block = play.spec.values["block_on_attack"]
+    play.game_state.player.block += play.block
+
+
+def double_strength(play):
+    for buff in play.game_state.player.powers:
+        if buff.power_name == "Strength":
+            buff.amount *= 2
+
+
+def damage_on_block(play):
+    play.game_state.player.add_buff("Juggernaut", play.spec.values["damage_on_block"])
+
+
+def damage_on_attack(play):
+    if play.target is not None:
+        play.game_state.player.add_buff(
+            "Flame Barrier", play.spec.values["damage_on_attack"]
+        )
+
+
+def double_block(play):
+    play.game_state.player.block *= 2
+
+
+def draw_on_exhaust(play):
+    play.game_state.player.add_buff("Dark Embrace", play.spec.values["draw_on_exhaust"])
+
+
+def give_power_per_turn(play):
+    play.game_state.player.add_buff(
+        "Demon Form", play.spec.values["give_power_per_turn"]
+    )
+
+
+def block_never_expires(play):
+    play.game_state.player.add_buff(
+        "Barricade", play.spec.values["block_never_expires"]
+    )
+
+
+def lose_hp_per_turn(play):
+    play.game_state.player.add_buff("Brutality", play.spec.values["lose_hp_per_turn"])
+
+
+def skills_cost_zero(play):
+    play.game_state.player.add_buff("Corruption", play.spec.values["skills_cost_zero"])
+
+
+def reduce_strength(play):
+    if play.target is not None:
+        play.target.add_buff("Strength", -play.spec.values["reduce_strength"])
+
+
+def burns_to_draw(play):
+    burn_card = Card(
+        card_id="Burn",
+        name="Burn",
+        card_type=CardType(4),
+        rarity="COMMON",
+        cost=-1,
+        is_playable=False,
+    )
+    record_list(play.game_state.draw_pile)
+    play.game_state.draw_pile.append(burn_card)
+    track_card_added(play.game_state, burn_card, "draw_pile")
+
+
+def add_wounds_to_hand(play):
+    wound_card = Card(
+        card_id="Wound",
+        name="Wound",
+        card_type=CardType(4),
+        rarity="COMMON",
+        cost=-2,
+        is_playable=False,
+    )
+    record_list(play.game_state.hand)
+    play.game_state.hand.append(wound_card)
+    play.game_state.hand.append(wound_card)
+    track_card_added(play.game_state, wound_card, "hand")
+    track_card_added(play.game_state, wound_card, "hand")
+
+
+def sword_boomerang(play):
+    for i in range(play.spec.hits):
+        play.damage = deal_damage(play.spec, play.game_state, play.target)
+    play.no_extra_damage = True
+
+
+def weaken_all(play):
+    for monster in play.game_state.monsters:
+        monster.add_buff("Weakened", play.spec.values["weak_aoe"])
+
+
+def vulnerable_all(play):
+    for monster in play.game_state.monsters:
+        monster.add_buff("Vulnerable", play.spec.values["vulnerable_aoe"])
+
+
+def whirlwind(play):
+    while play.game_state.player.energy > 0:
+        play.game_state.player.energy -= 1
+        for aoe_monster in play.game_state.monsters:
+            if aoe_monster.current_hp > 0 and aoe_monster.is_gone == False:
+                play.damage = deal_damage(
+                    play.spec, play.game_state, aoe_monster
+                )
+    play.no_extra_damage = True
+
+
+def gain_max_hp_on_kill(play):
+    if play.target is not None:
+        feed_heal = play.spec.values["gain_max_hp_on_kill"]
+        play.no_extra_damage = True
+        play.damage = deal_damage(play.spec, play.game_state, play.target)
+
+        # Check if Feed will kill the target
+        if play.target.current_hp <= 0:
+            # Simulate the kill and the HP gain
+            play.game_state.player.max_hp += feed_heal
+            play.game_state.player.current_hp += feed_heal
+            play.agent.feed_effect_used = True
+        else:
+            play.agent.feed_effect_used = False
+
+
+# Every effect of the card dictionary in the order the simulation applies them
+card_effects = [
+    ("block", gain_block),
+    ("self_vulnerable", self_vulnerable),
+    ("weak", weaken_target),
+    ("strength", gain_strength),
+    ("draw", draw),
+    ("draw_on_status", draw_on_status),
+    ("gain_energy", gain_energy),
+    ("lose_hp", lose_hp),
+    ("exhaust", exhaust),
+    ("aoe", damage_all),
+    ("exhaust_non_attack", exhaust_non_attacks),
+    ("based_on_block", damage_based_on_block),
+    ("play_top_card", play_top_card),
+    ("create_copy", create_copy),
+    ("gain_block_on_exhaust", gain_block_on_exhaust),
+    ("gain_strength_on_hp_loss", gain_strength_on_hp_loss),
+    ("exhaust_hand", exhaust_hand),
+    ("multiple_hits", multiple_hits),
+    ("block_on_attack", block_on_attack),
+    ("double_strength", double_strength),
+    ("damage_on_block", damage_on_block),
+    ("damage_on_attack", damage_on_attack),
+    ("double_block", double_block),
+    ("draw_on_exhaust", draw_on_exhaust),
+    ("give_power_per_turn", give_power_per_turn),
+    ("block_never_expires", block_never_expires),
+    ("lose_hp_per_turn", lose_hp_per_turn),
+    ("skills_cost_zero", skills_cost_zero),
+    ("reduce_strength", reduce_strength),
+    ("burns_to_draw", burns_to_draw),
+    ("add_wounds_to_hand", add_wounds_to_hand),
+    ("sword_boomerang_handle", sword_boomerang),
+    ("weak_aoe", weaken_all),
+    ("vulnerable_aoe", vulnerable_all),
+    ("whirlwind_handle", whirlwind),
+    ("gain_max_hp_on_kill", gain_max_hp_on_kill),
+]
+
+
+def compile_card_program(spec):
+    """The effects a card actually has, so playing it doesn't go through every key of the dictionary"""
+    return tuple(effect for key, effect in card_effects if key in spec.values)
+
+
+# Compiled once for every card of the dictionary
+card_programs = {
+    card_name: compile_card_program(spec) for card_name, spec in card_specs.items()
+}
+
+
+def get_card_program(spec):
+    return card_programs.get(spec.name, ())
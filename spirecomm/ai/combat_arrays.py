@@ -0,0 +1,563 @@
+"""Structure-of-arrays form of a simulated combat, for search backends working on NumPy arrays instead of the object graph.
+
+A CombatArrays keeps every number the simulation changes in one int64 array: the player vector, a row per monster, the damage
+counters of the turn, the power list of every character and the five piles as indexes in a card table. Copying a state is a
+single ndarray.copy(). The card table, the power kinds and the game the arrays were made from are shared by every copy.
+
+Only the states and cards the array effects model exactly are supported, see get_unsupported_reason and get_card_unsupported_reason:
+the cards can deal damage, block, draw, gain energy or strength, lose hp and apply weak or vulnerable, and no character can have a
+power the simulation of a card reacts to, like Juggernaut or Curl Up. Strength, Dexterity and the debuffs are columns of their
+owner, the other powers are only carried. The object simulation of SimpleAgent.simulate_card_play stays the reference,
+checks/check_combat_arrays.py compares both on stored states.
+
+SimpleAgent.search_depth plays the cards on the arrays with its array_search flag, when get_search_unsupported_reason accepts
+the state and the cards. NumPy is only needed by this module, the agent only imports it for array_search.
+"""
+
+import numpy as np
+
+from spirecomm.ai import card_effects
+from spirecomm.ai.combat_context import get_combat_context
+from spirecomm.spire.power import Power
+
+player_fields = ("current_hp", "max_hp", "block", "energy")
+player_powers = ("Strength", "Dexterity", "Vulnerable", "Weakened", "Frail")
+monster_fields = ("current_hp", "max_hp", "block", "is_gone", "move_adjusted_damage")
+monster_powers = ("Strength", "Vulnerable", "Weakened")
+turn_fields = ("damage_dealt", "instances_of_damage", "cards_drawn_this_turn", "turn")
+piles = ("hand", "draw_pile", "discard_pile", "exhaust_pile", "played_cards")
+
+# Columns of the player vector and of the monster rows
+PLAYER_COLUMNS = {name: i for i, name in enumerate(player_fields + player_powers)}
+MONSTER_COLUMNS = {name: i for i, name in enumerate(monster_fields + monster_powers)}
+TURN_COLUMNS = {name: i for i, name in enumerate(turn_fields)}
+
+# Debuffs count when the power is in the list, has_debuff doesn't read the amount, so they must stay above 0 to be a column
+presence_powers = ("Vulnerable", "Weakened", "Frail")
+
+# Powers simulate_card_play, deal_damage or handle_enemy_powers react to, a state with one of them isn't supported
+reactive_powers = frozenset(
+    [
+        "Juggernaut",
+        "Evolve",
+        "Flame Barrier",
+        "Rupture",
+        "Brutality",
+        "Intangible",
+        "Feel No Pain",
+        "Dark Embrace",
+        "Corruption",
+        "Curl Up",
+        "Anger",
+        "Angry",
+        "Artifact",
+        "Malleable",
+        "Buffer",
+        "Invincible",
+        "Mode Shift",
+        "Plated Armor",
+        "Flight",
+        "Split",
+        "Sharp Hide",
+        "Thorns",
+    ]
+)
+
+# Cards added to the piles by a simulation get room in the piles and the power list without growing the array
+spare_capacity = 16
+
+
+class CombatLayout:
+    """What every copy of a CombatArrays shares: the game it was made from, the card table, the power kinds and where each part of the
+    array starts. The card table and the power kinds only ever grow, the indexes stored in the arrays stay valid
+    """
+
+    def __init__(self, game_state):
+        self.template = game_state
+        self.context = get_combat_context(game_state)
+        self.monster_count = len(game_state.monsters)
+
+        self.cards = []
+        self.card_indexes = {}
+        self.power_kinds = []
+        self.power_kind_indexes = {}
+
+        self.pile_capacity = (
+            sum(len(getattr(game_state, pile)) for pile in piles) + spare_capacity
+        )
+        self.power_capacity = (
+            len(game_state.player.powers)
+            + sum(len(monster.powers) for monster in game_state.monsters)
+            + spare_capacity
+        )
+
+        self.player_start = 0
+        self.turn_start = self.player_start + len(PLAYER_COLUMNS)
+        # The length of every pile, then the number of powers
+        self.lengths_start = self.turn_start + len(TURN_COLUMNS)
+        self.monsters_start = self.lengths_start + len(piles) + 1
+        self.powers_start = self.monsters_start + self.monster_count * len(
+            MONSTER_COLUMNS
+        )
+        self.piles_start = self.powers_start + self.power_capacity * 3
+        self.size = self.piles_start + len(piles) * self.pile_capacity
+
+    def get_card_index(self, card):
+        index = self.card_indexes.get(id(card))
+        if index is None:
+            index = len(self.cards)
+            self.cards.append(card)
+            self.card_indexes[id(card)] = index
+        return index
+
+    def get_power_kind(self, power):
+        """Index of everything of a power but its amount"""
+        return self.get_kind_index(
+            (
+                power.power_id,
+                power.power_name,
+                power.damage,
+                power.misc,
+                power.just_applied,
+                power.card,
+            )
+        )
+
+    def get_kind_index(self, kind):
+        index = self.power_kind_indexes.get(kind)
+        if index is None:
+            index = len(self.power_kinds)
+            self.power_kinds.append(kind)
+            self.power_kind_indexes[kind] = index
+        return index
+
+
+class CombatArrays:
+    """The combat sections of a game state as one int64 array, see the module docstring"""
+
+    __slots__ = ("layout", "data")
+
+    def __init__(self, layout, data):
+        self.layout = layout
+        self.data = data
+
+    def copy(self):
+        return CombatArrays(self.layout, self.data.copy())
+
+    @property
+    def player(self):
+        layout = self.layout
+        return self.data[layout.player_start : layout.turn_start]
+
+    @property
+    def turn_counters(self):
+        layout = self.layout
+        return self.data[layout.turn_start : layout.lengths_start]
+
+    @property
+    def lengths(self):
+        layout = self.layout
+        return self.data[layout.lengths_start : layout.monsters_start]
+
+    @property
+    def monsters(self):
+        layout = self.layout
+        return self.data[layout.monsters_start : layout.powers_start].reshape(
+            layout.monster_count, len(MONSTER_COLUMNS)
+        )
+
+    @property
+    def powers(self):
+        """(owner, power kind, amount) of every power in the order of the lists, the owner is 0 for the player and 1 + the position
+        of a monster. The amounts of the powers with a column are kept in both
+        """
+        layout = self.layout
+        count = self.data[layout.monsters_start - 1]
+        return self.data[
+            layout.powers_start : layout.powers_start + count * 3
+        ].reshape(count, 3)
+
+    def get_pile(self, pile_index):
+        layout = self.layout
+        start = layout.piles_start + pile_index * layout.pile_capacity
+        return self.data[start : start + self.lengths[pile_index]]
+
+    def set_pile(self, pile_index, card_indexes):
+        layout = self.layout
+        if len(card_indexes) > layout.pile_capacity:
+            raise ValueError(f"{piles[pile_index]} is over the capacity of the arrays")
+        start = layout.piles_start + pile_index * layout.pile_capacity
+        self.data[start : start + len(card_indexes)] = card_indexes
+        self.lengths[pile_index] = len(card_indexes)
+
+    def append_power(self, owner, kind, amount):
+        layout = self.layout
+        count = self.data[layout.monsters_start - 1]
+        if count == layout.power_capacity:
+            raise ValueError("The power list is over the capacity of the arrays")
+        start = layout.powers_start + count * 3
+        self.data[start : start + 3] = (owner, kind, amount)
+        self.data[layout.monsters_start - 1] = count + 1
+
+    @classmethod
+    def from_game(cls, game_state):
+        """The arrays of a supported state, raises ValueError with the reason otherwise"""
+        reason = get_unsupported_reason(game_state)
+        if reason is not None:
+            raise ValueError(reason)
+
+        layout = CombatLayout(game_state)
+        arrays = cls(layout, np.zeros(layout.size, dtype=np.int64))
+
+        player = game_state.player
+        arrays.player[:] = [getattr(player, name) for name in player_fields] + [
+            player.power_amount(power_id) for power_id in player_powers
+        ]
+        arrays.turn_counters[:] = [getattr(game_state, name) for name in turn_fields]
+        for row, monster in zip(arrays.monsters, game_state.monsters):
+            row[:] = [getattr(monster, name) for name in monster_fields] + [
+                monster.power_amount(power_id) for power_id in monster_powers
+            ]
+
+        for owner, character in enumerate([player] + game_state.monsters):
+            for power in character.powers:
+                arrays.append_power(owner, layout.get_power_kind(power), power.amount)
+
+        for pile_index, pile in enumerate(piles):
+            arrays.set_pile(
+                pile_index,
+                [layout.get_card_index(card) for card in getattr(game_state, pile)],
+            )
+        return arrays
+
+    def get_character_powers(self, owner):
+        """The Power objects of a character, built again from the power kinds"""
+        power_kinds = self.layout.power_kinds
+        powers = []
+        for power_owner, kind, amount in self.powers:
+            if power_owner == owner:
+                power_id, name, damage, misc, just_applied, card = power_kinds[kind]
+                powers.append(
+                    Power(power_id, name, int(amount), damage, misc, just_applied, card)
+                )
+        return powers
+
+    def to_game(self):
+        """A simulated game state identical to what the object simulation would have, the parts the arrays don't hold come from
+        the game the arrays were made from
+        """
+        game_state = self.layout.template.clone_for_simulation()
+        cards = self.layout.cards
+
+        player = game_state.player
+        for name in player_fields:
+            setattr(player, name, int(self.player[PLAYER_COLUMNS[name]]))
+        player.powers = self.get_character_powers(0)
+        for name in turn_fields:
+            setattr(game_state, name, int(self.turn_counters[TURN_COLUMNS[name]]))
+        for position, (row, monster) in enumerate(
+            zip(self.monsters, game_state.monsters)
+        ):
+            for name in monster_fields:
+                value = int(row[MONSTER_COLUMNS[name]])
+                setattr(monster, name, bool(value) if name == "is_gone" else value)
+            monster.powers = self.get_character_powers(position + 1)
+
+        for pile_index, pile in enumerate(piles):
+            setattr(
+                game_state,
+                pile,
+                [cards[index] for index in self.get_pile(pile_index)],
+            )
+        return game_state
+
+
+def get_unsupported_reason(game_state):
+    """Why the array effects can't simulate this state exactly, None when they can"""
+    if game_state.running_totals is not None:
+        return "The state has the running totals of a search"
+    player = game_state.player
+    if player.hand or player.draw_pile or player.discard_pile:
+        return "Player.draw would move cards of the player's own piles"
+    characters = [(player, player_powers)] + [
+        (monster, monster_powers) for monster in game_state.monsters
+    ]
+    for character, supported_powers in characters:
+        power_ids = [
+            power.power_id
+            for power in character.powers
+            if power.power_id in supported_powers
+        ]
+        if len(set(power_ids)) != len(power_ids):
+            return "A character has two powers with the same column"
+        for power in character.powers:
+            if (
+                power.power_id in reactive_powers
+                or power.power_name in reactive_powers
+            ):
+                return f"{power.power_id} isn't modeled by the array effects"
+            column_power = (
+                power.power_id in player_powers or power.power_name in player_powers
+            )
+            if column_power and power.power_id not in supported_powers:
+                return f"{power.power_id} has no column for its owner"
+            if column_power and power.power_name != power.power_id:
+                return f"{power.power_id} is named {power.power_name}"
+            if power.power_id in presence_powers and power.amount <= 0:
+                return f"{power.power_id} has an amount of {power.amount}"
+    if any(monster.monster_id == "FungiBeast" for monster in game_state.monsters):
+        return "Killing a FungiBeast reads its powers"
+    return None
+
+
+def get_card_unsupported_reason(card):
+    """Why the array effects can't play this card exactly, None when they can"""
+    spec = card.spec
+    if "heal_on_damage" in spec.values:
+        return "heal_on_damage"
+    for effect in card_effects.get_card_program(spec):
+        if effect not in array_effects:
+            return effect.__name__
+    return None
+
+
+def get_search_unsupported_reason(game_state, cards):
+    """Why a search of these cards from this state can't play them on the arrays, None when it can"""
+    reason = get_unsupported_reason(game_state)
+    if reason is not None:
+        return reason
+    for card in cards:
+        reason = get_card_unsupported_reason(card)
+        if reason is not None:
+            return f"{card.card_id}: {reason}"
+    return None
+
+
+def has_power(values, columns, power_id):
+    return values[columns[power_id]] > 0
+
+
+def add_buff(arrays, owner, buff_name, amount):
+    """Character.add_buff, every power of a supported state has a column and its id as its name"""
+    columns = PLAYER_COLUMNS if owner == 0 else MONSTER_COLUMNS
+    values = arrays.player if owner == 0 else arrays.monsters[owner - 1]
+    power_kinds = arrays.layout.power_kinds
+    for power in arrays.powers:
+        if power[0] == owner and power_kinds[power[1]][1] == buff_name:
+            power[2] += amount
+            break
+    else:
+        kind = arrays.layout.get_kind_index((buff_name, buff_name, 0, 0, False, None))
+        arrays.append_power(owner, kind, amount)
+    values[columns[buff_name]] += amount
+
+
+def deal_damage(arrays, spec, targets):
+    """card_effects.deal_damage on every monster of the targets mask at once, returns the damage each of them took"""
+    player = arrays.player
+    monsters = arrays.monsters
+    context = arrays.layout.context
+
+    damage = spec.damage
+    if damage <= 0:
+        return np.zeros(len(monsters), dtype=np.int64)
+
+    current_strength = int(player[PLAYER_COLUMNS["Strength"]])
+    damage += current_strength
+    if spec.strength_multiplier:
+        damage += max(1, current_strength) * spec.strength_multiplier
+
+    damages = np.full(len(monsters), damage, dtype=np.int64)
+    vulnerable = monsters[:, MONSTER_COLUMNS["Vulnerable"]] > 0
+    relic_targets = vulnerable | context.has_damage_relics
+    is_first_turn = arrays.turn_counters[TURN_COLUMNS["turn"]] == 0
+    for relic_id in context.damage_relics:
+        if relic_id == "Akabeko" and is_first_turn:
+            damages[relic_targets] += 8
+        if relic_id == "Pen Nib":
+            damages[relic_targets] *= 2
+        multiplier = 1.75 if relic_id == "Paper Phrog" else 1.50
+        # int() of a float rounds toward zero, like astype
+        damages[vulnerable] = (damages[vulnerable] * multiplier).astype(np.int64)
+
+    if has_power(player, PLAYER_COLUMNS, "Weakened"):
+        damages = (damages * 0.75).astype(np.int64)
+
+    damages[~targets] = 0
+    arrays.turn_counters[TURN_COLUMNS["damage_dealt"]] += damages.sum()
+
+    # Block takes the damage first, what breaks through it comes off the hp
+    block = monsters[:, MONSTER_COLUMNS["block"]] - damages
+    broken = targets & (block <= 0)
+    damages = np.where(broken, np.abs(block), 0)
+    monsters[:, MONSTER_COLUMNS["block"]] = np.where(
+        targets, np.where(broken, 0, block), monsters[:, MONSTER_COLUMNS["block"]]
+    )
+    hp = monsters[:, MONSTER_COLUMNS["current_hp"]] - damages
+    monsters[:, MONSTER_COLUMNS["current_hp"]] = hp
+    return np.where(broken & (hp <= 0), damages + hp, damages)
+
+
+def get_alive(arrays):
+    monsters = arrays.monsters
+    return (monsters[:, MONSTER_COLUMNS["current_hp"]] > 0) & (
+        monsters[:, MONSTER_COLUMNS["is_gone"]] == 0
+    )
+
+
+def get_target_mask(arrays, target):
+    mask = np.zeros(len(arrays.monsters), dtype=bool)
+    mask[target] = True
+    return mask
+
+
+class ArrayPlay:
+    """CardPlay of the array effects, target is the position of the targeted monster or None"""
+
+    def __init__(self, arrays, card, target):
+        self.arrays = arrays
+        self.card = card
+        self.spec = card.spec
+        self.target = target
+        self.hits = card.spec.multiple_hits
+        self.no_extra_damage = False
+        player = arrays.player
+        self.current_dexterity = int(player[PLAYER_COLUMNS["Dexterity"]])
+        self.is_frail = has_power(player, PLAYER_COLUMNS, "Frail")
+
+
+def gain_block(play):
+    block = play.spec.block
+    if block != 0:
+        block += play.current_dexterity
+        if play.is_frail:
+            block = int(block * 0.75)
+        play.arrays.player[PLAYER_COLUMNS["block"]] += block
+
+
+def weaken_target(play):
+    if play.target is not None:
+        add_buff(play.arrays, play.target + 1, "Weakened", play.spec.weak)
+
+
+def gain_strength(play):
+    add_buff(play.arrays, 0, "Strength", play.spec.strength)
+
+
+def draw(play):
+    # The player's own piles are empty in a supported state, only the count of draws changes
+    play.arrays.turn_counters[TURN_COLUMNS["cards_drawn_this_turn"]] += 1
+
+
+def gain_energy(play):
+    play.arrays.player[PLAYER_COLUMNS["energy"]] += play.spec.gain_energy
+
+
+def lose_hp(play):
+    context = play.arrays.layout.context
+    lose_hp = play.spec.lose_hp
+    if context.has_torii and lose_hp <= 5:
+        lose_hp = 1
+    if context.has_trod:
+        lose_hp -= 1
+    play.arrays.player[PLAYER_COLUMNS["current_hp"]] -= lose_hp
+
+
+def damage_all(play):
+    play.no_extra_damage = True
+    deal_damage(play.arrays, play.spec, get_alive(play.arrays))
+
+
+def multiple_hits(play):
+    if play.target is not None:
+        play.no_extra_damage = True
+        target = get_target_mask(play.arrays, play.target)
+        for _ in range(play.hits):
+            if (get_alive(play.arrays) & target).any():
+                deal_damage(play.arrays, play.spec, target)
+
+
+def weaken_all(play):
+    for position in range(len(play.arrays.monsters)):
+        add_buff(play.arrays, position + 1, "Weakened", play.spec.values["weak_aoe"])
+
+
+def vulnerable_all(play):
+    for position in range(len(play.arrays.monsters)):
+        add_buff(
+            play.arrays, position + 1, "Vulnerable", play.spec.values["vulnerable_aoe"]
+        )
+
+
+# The array version of every card effect of card_effects this module models
+array_effects = {
+    card_effects.gain_block: gain_block,
+    card_effects.weaken_target: weaken_target,
+    card_effects.gain_strength: gain_strength,
+    card_effects.draw: draw,
+    card_effects.gain_energy: gain_energy,
+    card_effects.lose_hp: lose_hp,
+    card_effects.damage_all: damage_all,
+    card_effects.multiple_hits: multiple_hits,
+    card_effects.weaken_all: weaken_all,
+    card_effects.vulnerable_all: vulnerable_all,
+}
+
+
+def find_target(arrays, target):
+    """Position of the first monster equal to target like Monster.__eq__ compares them, simulate_card_play looks the target up the same way"""
+    if target is None:
+        return None
+    target_powers = [(power.power_id, power.amount) for power in target.powers]
+    for position, (row, monster) in enumerate(
+        zip(arrays.monsters, arrays.layout.template.monsters)
+    ):
+        if (
+            monster.name == target.name
+            and row[MONSTER_COLUMNS["current_hp"]] == target.current_hp
+            and row[MONSTER_COLUMNS["max_hp"]] == target.max_hp
+            and row[MONSTER_COLUMNS["block"]] == target.block
+            and [
+                (power.power_id, power.amount)
+                for power in arrays.get_character_powers(position + 1)
+            ]
+            == target_powers
+        ):
+            return position
+    return None
+
+
+def play_card(arrays, card, target=None):
+    """SimpleAgent.simulate_card_play on the arrays, changes them in place. card must be supported, see get_card_unsupported_reason"""
+    layout = arrays.layout
+    player = arrays.player
+    target_position = find_target(arrays, target)
+
+    hand = list(arrays.get_pile(0))
+    card_index = next(
+        (index for index in hand if layout.cards[index] == card),
+        None,
+    )
+    if card_index is None or card.cost > player[PLAYER_COLUMNS["energy"]]:
+        return arrays
+    hand.remove(card_index)
+    arrays.set_pile(0, hand)
+    arrays.set_pile(4, list(arrays.get_pile(4)) + [card_index])
+
+    play = ArrayPlay(arrays, card, target_position)
+    for effect in card_effects.get_card_program(card.spec):
+        array_effects[effect](play)
+
+    # None of the powers simulate_card_play and handle_enemy_powers react to are in a supported state
+    if (
+        not play.no_extra_damage
+        and target_position is not None
+        and get_alive(arrays)[target_position]
+    ):
+        deal_damage(arrays, card.spec, get_target_mask(arrays, target_position))
+
+    player[PLAYER_COLUMNS["energy"]] -= max(0, card.cost)
+
+    if card.spec.vulnerable and target_position is not None:
+        add_buff(arrays, target_position + 1, "Vulnerable", card.spec.vulnerable)
+    return arrays
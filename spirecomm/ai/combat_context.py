@@ -0,0 +1,65 @@
+class CombatContext:
+    """Everything the simulation reads from the relics and the monsters of the fight that can't change while a card is played.
+    Built once per combat by get_combat_context and rebuilt only when the relics or the encounter change
+    """
+
+    # Monsters whose death wins the fight
+    leader_names = ["Reptomancer", "The Collector", "Gremlin Leader"]
+    # Monsters get_best_target handles apart
+    special_target_names = ["Gremlin Wizard", "Sentry", "Torch Head", "Donu", "Centurion"]
+
+    def __init__(self, relics, monsters):
+        relic_names = [relic.name for relic in relics]
+        self.relic_names = relic_names
+        self.has_torii = "Torii" in relic_names
+        self.has_trod = "Tungsten Rod" in relic_names
+        self.has_orichalcum = "Orichalcum" in relic_names
+
+        # deal_damage goes through the relics in order, only these change the damage. Every relic applies the vulnerable multiplier
+        self.damage_relics = tuple(
+            relic.relic_id
+            if relic.relic_id in ["Akabeko", "Paper Phrog"]
+            or (relic.relic_id == "Pen Nib" and relic.counter == 10)
+            else None
+            for relic in relics
+        )
+        self.has_damage_relics = any(
+            relic_id in ["Akabeko", "Pen Nib"] for relic_id in self.damage_relics
+        )
+
+        self.leader_indexes = frozenset(
+            monster.monster_index
+            for monster in monsters
+            if monster.name in self.leader_names
+        )
+        self.has_special_targets = any(
+            monster.name in self.special_target_names for monster in monsters
+        )
+
+
+def get_context_key(game_state):
+    """Changes when a relic is gained or used up (Pen Nib counts the attacks) and when a monster joins or leaves the encounter"""
+    return (
+        tuple((relic.relic_id, relic.name, relic.counter) for relic in game_state.relics),
+        tuple((monster.monster_id, monster.name) for monster in game_state.monsters),
+    )
+
+
+# The context of the last combat seen, every message of the game comes as a new game state
+cached_context = None
+cached_key = None
+
+
+def get_combat_context(game_state):
+    """The CombatContext of game_state. Clones of the state share it, it isn't part of what the simulation changes so it isn't journaled"""
+    global cached_context, cached_key
+
+    context = game_state.combat_context
+    if context is None:
+        key = get_context_key(game_state)
+        if key != cached_key:
+            cached_context = CombatContext(game_state.relics, game_state.monsters)
+            cached_key = key
+        context = cached_context
+        object.__setattr__(game_state, "combat_context", context)
+    return context
@@ -0,0 +1,336 @@
+from spirecomm.ai.combat_context import get_combat_context
+from spirecomm.ai.state_hash import (
+    HASH_MASK,
+    card_hash,
+    field_hash,
+    get_state_hash,
+    powers_hash,
+)
+from spirecomm.spire.undo import Journaled
+
+
+def is_status_or_curse(card):
+    return card.type.name in ["STATUS", "CURSE"]
+
+
+def exhaust_weight(card):
+    """What a card in the exhaust pile adds to evaluate_state. Feed is counted apart, its weight depends on agent.feed_effect_used"""
+    if is_status_or_curse(card):
+        return 20
+    if card.card_id not in ["Defend_R", "Attack_R"]:
+        return -5
+    return 0
+
+
+# Damage a Burn, Burn+ or Decay left in hand deals at the end of the turn, before Intangible, Torii and Tungsten Rod
+end_of_turn_damage = {"Burn": 2, "Burn+": 4, "Decay": 2}
+
+
+def count_hand_burns(hand):
+    """(cards dealing 2, cards dealing 4) in hand at the end of the turn"""
+    return (
+        sum(1 for card in hand if end_of_turn_damage.get(card.name) == 2),
+        sum(1 for card in hand if end_of_turn_damage.get(card.name) == 4),
+    )
+
+
+def hand_burn_damage(hand_burns, has_intangible, has_torii, has_trod):
+    """Damage of the Burns and Decays counted by count_hand_burns, the hand side of SimpleAgent.get_player_damage.
+    Intangible and Torii turn each of them into 1, Tungsten Rod lowers each of them
+    """
+    damage = 0
+    for base_damage, count in zip((2, 4), hand_burns):
+        card_damage = 1 if has_intangible or has_torii else base_damage
+        if has_trod:
+            card_damage -= 1
+        damage += card_damage * count
+    return damage
+
+
+def player_has_intangible(player):
+    return player.get_power("Intangible") is not None
+
+
+def monster_incoming_damage(monster, has_intangible, has_torii, has_trod):
+    """Damage the intent of a monster alive deals this turn, the monster side of SimpleAgent.get_incoming_damage.
+    Intangible turns every hit into 1, Torii and Tungsten Rod lower each hit
+    """
+    damage = monster.move_adjusted_damage
+    if damage is None or damage <= 0:
+        return 0
+    if has_intangible:
+        return 0 if has_trod else 1 * monster.move_hits
+    if damage <= 5 and has_torii:
+        damage = 1
+    if has_trod:
+        damage -= 1
+    return damage * monster.move_hits
+
+
+def player_terms(player):
+    """(score, alive monsters, leaders killed, monster damage) the player adds to evaluate_state"""
+    return (
+        player.power_amount("Strength") * 700
+        + player.power_amount("Dexterity") * 200
+        - player.power_amount("Vulnerable") * 75,
+        0,
+        0,
+        0,
+    )
+
+
+def monster_terms(monster, leader_indexes, has_intangible, has_torii, has_trod):
+    """(score, alive monsters, leaders killed, monster damage) a monster adds to evaluate_state, its hp is the score of a monster alive"""
+    if monster.current_hp <= 0 or monster.is_gone == True:
+        return 1000, 0, 1 if monster.monster_index in leader_indexes else 0, 0
+    return (
+        100 * monster.power_amount("Vulnerable")
+        + 100 * monster.power_amount("Weakened")
+        - 100 * monster.power_amount("Strength")
+        - monster.current_hp,
+        1,
+        0,
+        monster_incoming_damage(monster, has_intangible, has_torii, has_trod),
+    )
+
+
+def count_monster_damage(game_state):
+    """The damage the monsters alive deal this turn, counted from scratch"""
+    context = get_combat_context(game_state)
+    has_intangible = player_has_intangible(game_state.player)
+    return sum(
+        monster_incoming_damage(
+            monster, has_intangible, context.has_torii, context.has_trod
+        )
+        for monster in game_state.monsters
+        if monster.current_hp > 0 and not monster.is_gone
+    )
+
+
+def count_running_terms(game_state):
+    """Every term RunningTotals keeps, counted from scratch:
+    (score of the player and monsters, monsters alive, leaders killed, damage of the monsters, Burns and Decays in hand,
+    status and curse cards in hand, draw and discard piles, exhaust pile weight, Feeds exhausted)
+    """
+    context = get_combat_context(game_state)
+    has_intangible = player_has_intangible(game_state.player)
+    score, alive_monsters, killed_leaders, monster_damage = player_terms(
+        game_state.player
+    )
+    for monster in game_state.monsters:
+        terms = monster_terms(
+            monster,
+            context.leader_indexes,
+            has_intangible,
+            context.has_torii,
+            context.has_trod,
+        )
+        score += terms[0]
+        alive_monsters += terms[1]
+        killed_leaders += terms[2]
+        monster_damage += terms[3]
+
+    status_curse_cards = sum(
+        1
+        for pile in (game_state.hand, game_state.discard_pile, game_state.draw_pile)
+        for card in pile
+        if is_status_or_curse(card)
+    )
+    exhaust_score = sum(exhaust_weight(card) for card in game_state.exhaust_pile)
+    exhausted_feeds = sum(1 for card in game_state.exhaust_pile if card.card_id == "Feed")
+    return (
+        score,
+        alive_monsters,
+        killed_leaders,
+        monster_damage,
+        count_hand_burns(game_state.hand),
+        status_curse_cards,
+        exhaust_score,
+        exhausted_feeds,
+    )
+
+
+class RunningTotals(Journaled):
+    """The terms of evaluate_state that need a pass over the monsters, their powers and the piles, the damage the intents of the monsters
+    and the Burns in hand deal, and the Zobrist hash of the state the transposition table is keyed on, kept up to date by the simulation.
+
+    The player, the monsters and the game report the writes of their watched fields to field_changed and turn_field_changed,
+    the hash changes by the difference of the old and new value of the field. Changes to the powers of a character, and to their
+    amounts, are reported to powers_changed. Each character keeps the terms and the hash of its powers it last added in eval_terms
+    and powers_hash so only the difference is applied, the damage of every monster changes with Intangible on the player.
+    The card effects report the cards that move between piles to the
+    track_card_* functions. Every change is journaled, undoing a card rolls the totals back too
+    """
+
+    __slots__ = (
+        "player",
+        "monsters",
+        "leader_indexes",
+        "has_torii",
+        "has_trod",
+        "has_intangible",
+        "score",
+        "alive_monsters",
+        "killed_leaders",
+        "monster_damage",
+        "hand_burns",
+        "status_curse_cards",
+        "exhaust_score",
+        "exhausted_feeds",
+        "state_hash",
+    )
+
+    def __init__(self, game_state):
+        context = get_combat_context(game_state)
+        self.player = game_state.player
+        self.monsters = game_state.monsters
+        self.leader_indexes = context.leader_indexes
+        self.has_torii = context.has_torii
+        self.has_trod = context.has_trod
+        self.has_intangible = player_has_intangible(game_state.player)
+        (
+            self.score,
+            self.alive_monsters,
+            self.killed_leaders,
+            self.monster_damage,
+            self.hand_burns,
+            self.status_curse_cards,
+            self.exhaust_score,
+            self.exhausted_feeds,
+        ) = count_running_terms(game_state)
+        self.state_hash = get_state_hash(game_state)
+
+    def get_terms(self):
+        """The same tuple as count_running_terms"""
+        return (
+            self.score,
+            self.alive_monsters,
+            self.killed_leaders,
+            self.monster_damage,
+            self.hand_burns,
+            self.status_curse_cards,
+            self.exhaust_score,
+            self.exhausted_feeds,
+        )
+
+    def get_owner(self, character):
+        if character is self.player:
+            return "player"
+        return "monster", character.monster_index
+
+    def get_character_terms(self, character):
+        if character is self.player:
+            return player_terms(character)
+        return monster_terms(
+            character,
+            self.leader_indexes,
+            self.has_intangible,
+            self.has_torii,
+            self.has_trod,
+        )
+
+    def update_terms(self, character):
+        terms = self.get_character_terms(character)
+        old_terms = character.eval_terms
+        if terms != old_terms:
+            character.eval_terms = terms
+            self.score += terms[0] - old_terms[0]
+            self.alive_monsters += terms[1] - old_terms[1]
+            self.killed_leaders += terms[2] - old_terms[2]
+            self.monster_damage += terms[3] - old_terms[3]
+
+        # Intangible on the player changes the damage of every monster
+        if character is self.player:
+            has_intangible = player_has_intangible(character)
+            if has_intangible != self.has_intangible:
+                self.has_intangible = has_intangible
+                for monster in self.monsters:
+                    self.update_terms(monster)
+
+    def update_hash(self, owner, name, old_value, value):
+        self.state_hash = (
+            self.state_hash
+            + field_hash(owner, name, value)
+            - field_hash(owner, name, old_value)
+        ) & HASH_MASK
+
+    def field_changed(self, character, name, old_value):
+        """hp, block, energy... of the player or a monster changed"""
+        if character is not self.player and (
+            name == "current_hp" or name == "is_gone" or name == "move_adjusted_damage"
+        ):
+            self.update_terms(character)
+        self.update_hash(
+            self.get_owner(character), name, old_value, getattr(character, name)
+        )
+
+    def turn_field_changed(self, game_state, name, old_value):
+        """A damage counter of the turn changed"""
+        self.update_hash("turn", name, old_value, getattr(game_state, name))
+
+    def powers_changed(self, character):
+        self.update_terms(character)
+        new_powers_hash = powers_hash(self.get_owner(character), character.powers)
+        if new_powers_hash != character.powers_hash:
+            self.state_hash = (
+                self.state_hash + new_powers_hash - character.powers_hash
+            ) & HASH_MASK
+            character.powers_hash = new_powers_hash
+
+
+def start_running_totals(game_state):
+    """Counts the terms once and attaches the totals to the state and its characters, a search calls it on the root it simulates from"""
+    totals = RunningTotals(game_state)
+    for character in [game_state.player] + game_state.monsters:
+        character.eval_terms = totals.get_character_terms(character)
+    for character in [game_state.player] + game_state.monsters:
+        character.powers_hash = powers_hash(
+            totals.get_owner(character), character.powers
+        )
+        character.totals = totals
+    game_state.running_totals = totals
+    return totals
+
+
+def update_hand_burns(totals, card, change):
+    base_damage = end_of_turn_damage.get(card.name)
+    if base_damage is not None:
+        burns, burns_plus = totals.hand_burns
+        if base_damage == 2:
+            totals.hand_burns = (burns + change, burns_plus)
+        else:
+            totals.hand_burns = (burns, burns_plus + change)
+
+
+def track_card_added(game_state, card, pile):
+    """A card joined pile, the name of the hand, draw or discard pile attribute of the game"""
+    totals = game_state.running_totals
+    if totals is not None:
+        totals.state_hash = (totals.state_hash + card_hash(pile, card)) & HASH_MASK
+        if is_status_or_curse(card):
+            totals.status_curse_cards += 1
+        if pile == "hand":
+            update_hand_burns(totals, card, 1)
+
+
+def track_card_removed(game_state, card, pile):
+    """A card left pile, the name of the hand, draw or discard pile attribute of the game"""
+    totals = game_state.running_totals
+    if totals is not None:
+        totals.state_hash = (totals.state_hash - card_hash(pile, card)) & HASH_MASK
+        if is_status_or_curse(card):
+            totals.status_curse_cards -= 1
+        if pile == "hand":
+            update_hand_burns(totals, card, -1)
+
+
+def track_card_exhausted(game_state, card):
+    """A card joined the exhaust pile"""
+    totals = game_state.running_totals
+    if totals is not None:
+        totals.state_hash = (
+            totals.state_hash + card_hash("exhaust_pile", card)
+        ) & HASH_MASK
+        totals.exhaust_score += exhaust_weight(card)
+        if card.card_id == "Feed":
+            totals.exhausted_feeds += 1
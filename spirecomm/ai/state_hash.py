@@ -0,0 +1,70 @@
+"""Zobrist-style hashing of simulated combat states.
+
+Every feature of a state, the hp of the player or a card of the hand for example, gets a random 64 bit number and the hash of
+the state is their sum modulo 2**64. A sum keeps the piles and the powers multisets, two copies of a card don't cancel out like
+they would with a xor, and a change of a field changes the hash by the number of its new value minus the number of its old one,
+which is how RunningTotals keeps it up to date during a search.
+The hash covers what GameStateCache keyed on before: hp, max hp, block and energy of the player, hp, block, is_gone and damage
+of every monster, the powers of both, the four piles and the damage counters of the turn.
+"""
+
+from functools import lru_cache
+from hashlib import blake2b
+
+HASH_MASK = (1 << 64) - 1
+
+# The numbers of the features seen most recently are kept, a run goes through far more hp, block and damage values than a search
+ZOBRIST_CACHE_SIZE = 1 << 16
+
+
+@lru_cache(maxsize=ZOBRIST_CACHE_SIZE)
+def zobrist(feature):
+    """The random number of a feature, a tuple of strings and ints. It is derived from the feature itself instead of a random generator
+    so every process of the search pool gives the same number to the same feature
+    """
+    return int.from_bytes(blake2b(repr(feature).encode(), digest_size=8).digest(), "little")
+
+
+# The fields hashed for every owner, a monster is owned by ("monster", monster_index) and the damage counters by "turn"
+player_fields = ("current_hp", "max_hp", "block", "energy")
+monster_fields = ("current_hp", "block", "is_gone", "move_adjusted_damage")
+turn_fields = ("damage_dealt", "instances_of_damage", "cards_drawn_this_turn")
+
+
+def field_hash(owner, name, value):
+    # damage_dealt is a float after the halving of Flight or Invincible, a whole one gets the number of the int it equals
+    if type(value) is float and value.is_integer():
+        value = int(value)
+    return zobrist((owner, name, value))
+
+
+def fields_hash(owner, source, names):
+    return sum(field_hash(owner, name, getattr(source, name)) for name in names)
+
+
+def powers_hash(owner, powers):
+    return (
+        sum(zobrist((owner, "power", power.power_id, power.amount)) for power in powers)
+        & HASH_MASK
+    )
+
+
+def card_hash(pile, card):
+    return zobrist((pile, card.card_id, card.upgrades, card.cost))
+
+
+def get_state_hash(game_state):
+    """The hash of a combat state computed from scratch"""
+    player = game_state.player
+    state_hash = fields_hash("player", player, player_fields) + powers_hash(
+        "player", player.powers
+    )
+    for monster in game_state.monsters:
+        owner = ("monster", monster.monster_index)
+        state_hash += fields_hash(owner, monster, monster_fields)
+        state_hash += powers_hash(owner, monster.powers)
+    state_hash += fields_hash("turn", game_state, turn_fields)
+    for pile in ("hand", "draw_pile", "discard_pile", "exhaust_pile"):
+        for card in getattr(game_state, pile):
+            state_hash += card_hash(pile, card)
+    return state_hash & HASH_MASK
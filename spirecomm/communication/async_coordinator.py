@@ -0,0 +1,250 @@
+import asyncio
+import concurrent.futures
+import os
+import sys
+import threading
+from spirecomm.communication.coordinator import BaseCoordinator
+from spirecomm.communication.action import StartGameAction
+
+# The most bytes of a message, a game state late in a run is a few hundred kilobytes of JSON
+MESSAGE_LIMIT = 1 << 24
+
+
+def feed_reader(reader, loop, read_pipe):
+    """Read a pipe in a thread and feed what comes to an asyncio reader, until the end of the input
+
+    :param reader: the reader to feed
+    :type reader: asyncio.StreamReader
+    :param loop: the event loop of the reader
+    :type loop: asyncio.AbstractEventLoop
+    :param read_pipe: the file object to read
+    :return: None
+    """
+    # The thread's own reader, like read_stdin, a daemon thread blocked in sys.stdin.buffer would keep its lock at shutdown
+    input_stream = os.fdopen(read_pipe.fileno(), "rb", closefd=False)
+    while True:
+        data = input_stream.read1(1 << 16)
+        if not data:
+            loop.call_soon_threadsafe(reader.feed_eof)
+            return
+        loop.call_soon_threadsafe(reader.feed_data, data)
+
+
+class PipeWriter:
+    """The methods of asyncio.StreamWriter the coordinator uses, writing straight to a pipe. A command is a few
+    bytes, the write doesn't block the loop for long
+    """
+
+    def __init__(self, write_pipe):
+        # Kept so the pipe isn't closed while the writer uses its file descriptor
+        self.write_pipe = write_pipe
+        self.output_stream = os.fdopen(write_pipe.fileno(), "wb", closefd=False)
+
+    def write(self, data):
+        self.output_stream.write(data)
+        self.output_stream.flush()
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self.output_stream.close()
+
+
+async def connect_pipes(read_pipe=None, write_pipe=None, use_threads=None):
+    """Open an asyncio reader and writer over a pair of pipes, stdin and stdout by default
+
+    The proactor event loop, the default one on Windows, can't watch the anonymous pipes Slay the Spire gives as
+    stdin and stdout: there the reader is fed by a thread and the writer writes straight to the pipe.
+
+    :param read_pipe: the file object to read the messages from
+    :param write_pipe: the file object to write the commands to
+    :param use_threads: read with a thread instead of the event loop, by default only on Windows
+    :type use_threads: bool
+    :return: the reader and the writer
+    :rtype: tuple[asyncio.StreamReader, asyncio.StreamWriter or PipeWriter]
+    """
+    if read_pipe is None:
+        read_pipe = sys.stdin
+    if write_pipe is None:
+        write_pipe = sys.stdout
+    if use_threads is None:
+        use_threads = sys.platform == "win32"
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=MESSAGE_LIMIT)
+    if use_threads:
+        input_thread = threading.Thread(
+            target=feed_reader, args=(reader, loop, read_pipe)
+        )
+        input_thread.daemon = True
+        input_thread.start()
+        return reader, PipeWriter(write_pipe)
+    await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), read_pipe
+    )
+    transport, protocol = await loop.connect_write_pipe(
+        asyncio.streams.FlowControlMixin, write_pipe
+    )
+    writer = asyncio.StreamWriter(transport, protocol, None, loop)
+    return reader, writer
+
+
+class AsyncCoordinator(BaseCoordinator):
+    """An object to coordinate communication with Slay the Spire from an asyncio event loop
+
+    It has the API of Coordinator, with coroutines for the methods that wait for a message. The messages are read
+    and the commands written by asyncio streams instead of two threads, and the callbacks, a search of the agent
+    for example, run in an executor so they don't block the loop.
+    """
+
+    def __init__(
+        self, reader, writer, executor=None, pacing=None, file_path="output.txt", decode=None
+    ):
+        """
+        :param reader: the stream of the messages from Communication Mod, see connect_pipes
+        :type reader: asyncio.StreamReader
+        :param writer: the stream of the commands to Communication Mod
+        :type writer: asyncio.StreamWriter or PipeWriter
+        :param executor: where the callbacks run, a single thread by default
+        :type executor: concurrent.futures.Executor
+        :param pacing: when to wait before sending a command, no waiting by default
+        :type pacing: PacingPolicy
+        :param file_path: the path to the file where the messages are saved, None to not save them
+        :type file_path: str
+        :param decode: the JSON decoder of the messages, the fastest installed by default, see decoder.get_decoder
+        :type decode: function(message: bytes) -> dict
+        """
+        super().__init__(pacing, decode)
+        self.reader = reader
+        self.writer = writer
+        if executor is None:
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.executor = executor
+        self.file = open(file_path, "ab") if file_path is not None else None
+
+    @classmethod
+    async def connect(cls, read_pipe=None, write_pipe=None, use_threads=None, **kwargs):
+        """Make a coordinator talking over a pair of pipes, stdin and stdout by default, see connect_pipes
+
+        :param read_pipe: the file object to read the messages from
+        :param write_pipe: the file object to write the commands to
+        :param use_threads: read with a thread instead of the event loop, by default only on Windows
+        :type use_threads: bool
+        :return: the coordinator
+        :rtype: AsyncCoordinator
+        """
+        reader, writer = await connect_pipes(read_pipe, write_pipe, use_threads)
+        return cls(reader, writer, **kwargs)
+
+    def send_message(self, message):
+        """Send a command to Communication Mod and start waiting for a response
+
+        :param message: the message to send
+        :type message: str
+        :return: None
+        """
+        self.writer.write((message + "\n").encode("utf-8"))
+        self.game_is_ready = False
+
+    async def get_next_raw_message(self, timeout=None):
+        """Wait for the next message from Communication Mod
+
+        :param timeout: the most seconds to wait, None to wait forever
+        :type timeout: float
+        :return: the message from Communication Mod, None if none came in time
+        :rtype: bytes
+        """
+        await self.writer.drain()
+        try:
+            line = await asyncio.wait_for(self.reader.readline(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if not line:
+            raise EOFError("Communication Mod closed the connection")
+        message = line.rstrip(b"\r\n")
+        if self.file is not None:
+            self.file.write(message + b"\n")
+        return message
+
+    async def receive_game_state_update(self, perform_callbacks=True, timeout=None):
+        """Wait for the next message from Communication Mod and update the stored game state with it
+
+        :param perform_callbacks: set to True to perform callbacks based on the new game state
+        :type perform_callbacks: bool
+        :param timeout: the most seconds to wait, None to wait forever
+        :type timeout: float
+        :return: whether a message was received
+        """
+        message = await self.get_next_raw_message(timeout)
+        if message is None:
+            return False
+        self.update_game_state(message)
+        if perform_callbacks:
+            callback = self.get_callback()
+            if callback is not None:
+                new_callback, arguments = callback
+                loop = asyncio.get_running_loop()
+                new_action = await loop.run_in_executor(
+                    self.executor, new_callback, *arguments
+                )
+                self.add_action_to_queue(new_action)
+        return True
+
+    async def handle_next_event(self, perform_callbacks=True):
+        """Execute the next action if it is ready, then wait for the next message, until the next action
+        can be executed at the latest, and handle it
+
+        :param perform_callbacks: set to True to perform callbacks based on the new game state
+        :type perform_callbacks: bool
+        :return: whether a message was received
+        """
+        self.execute_next_action_if_ready()
+        wait_time = self.get_wait_time()
+        if wait_time <= 0:
+            await self.writer.drain()
+            return False
+        return await self.receive_game_state_update(
+            perform_callbacks=perform_callbacks, timeout=wait_time
+        )
+
+    async def run(self):
+        """Start executing actions until Communication Mod closes the connection
+
+        :return: None
+        """
+        try:
+            while True:
+                await self.handle_next_event(perform_callbacks=True)
+        except EOFError:
+            pass
+
+    async def play_one_game(self, player_class, ascension_level=0, seed="3YX9ILFLDCU74"):
+        """
+        :param player_class: the class to play
+        :type player_class: PlayerClass
+        :param ascension_level: the ascension level to use
+        :type ascension_level: int
+        :param seed: the alphanumeric seed to use
+        :type seed: str
+        :return: True if the game was a victory, else False
+        :rtype: bool
+        """
+        self.clear_actions()
+        while not self.game_is_ready:
+            await self.receive_game_state_update(perform_callbacks=False)
+        if not self.in_game:
+            StartGameAction(player_class, ascension_level, seed).execute(self)
+            await self.receive_game_state_update()
+        while self.in_game:
+            await self.handle_next_event()
+        return self.is_victory()
+
+    def close(self):
+        """Close the writer, the executor and the file of the messages
+
+        :return: None
+        """
+        self.writer.close()
+        self.executor.shutdown(wait=False)
+        if self.file is not None:
+            self.file.close()
@@ -1,34 +1,44 @@
+import abc
+import os
 import sys
 import queue
 import threading
-import json
 import collections
-from time import sleep
+import time
 from spirecomm.spire.game import Game
 from spirecomm.spire.screen import ScreenType
 from spirecomm.communication.action import StartGameAction
+from spirecomm.communication import decoder
 
 
-def read_stdin(input_queue, file_path):
-    """Read lines from stdin, write them to a queue, and save them to a file
+def read_stdin(input_queue, file_path, input_stream=None):
+    """Read lines from stdin, write their bytes to a queue, and save them to a file
+
+    Whole lines are read from a binary reader of stdin, a game state is tens of kilobytes
+    of JSON and reading it one character at a time took most of the time of a message.
+    The reader is this thread's own, not sys.stdin.buffer: a daemon thread blocked in a read of
+    sys.stdin.buffer holds its lock and the interpreter can't take it to shut down.
+    The lines stay bytes, the JSON decoder takes them as they are.
+    Stops at the end of the input.
 
     :param input_queue: A queue, to which lines from stdin will be written
     :type input_queue: queue.Queue
     :param file_path: The path to the file where the input will be saved
     :type file_path: str
+    :param input_stream: A binary stream to read instead of stdin
+    :type input_stream: io.BufferedIOBase
     :return: None
     """
-    with open(file_path, "a") as file:
+    if input_stream is None:
+        input_stream = os.fdopen(sys.stdin.fileno(), "rb", closefd=False)
+    with open(file_path, "ab") as file:
         while True:
-            stdin_input = ""
-            while True:
-                input_char = sys.stdin.read(1)
-                if input_char == "\n":
-                    break
-                else:
-                    stdin_input += input_char
+            line = input_stream.readline()
+            if not line:
+                return
+            stdin_input = line.rstrip(b"\r\n")
             input_queue.put(stdin_input)
-            file.write(stdin_input + "\n")
+            file.write(stdin_input + b"\n")
 
 
 def write_stdout(output_queue):
@@ -43,24 +53,54 @@ def write_stdout(output_queue):
         print(output, end="\n", flush=True)
 
 
-class Coordinator:
-    """An object to coordinate communication with Slay the Spire"""
+class PacingPolicy:
+    """How long the coordinator waits after a message from Communication Mod before it sends the next command
 
-    def __init__(self):
-        file_path = "output.txt"
-        self.input_queue = queue.Queue()
-        self.output_queue = queue.Queue()
-        self.input_thread = threading.Thread(
-            target=read_stdin, args=(self.input_queue, file_path)
-        )
-        self.output_thread = threading.Thread(
-            target=write_stdout, args=(self.output_queue,)
-        )
-        self.input_thread.daemon = True
-        self.input_thread.start()
-        self.output_thread.daemon = True
-        self.output_thread.start()
+    Communication Mod only reports ready_for_command once the game waits for input, so by default
+    the next command is sent right away. delay is waited after every message, like the fixed sleep
+    the coordinator used to do, screen_delays only after the messages of some screens.
+    """
+
+    def __init__(self, delay=0.0, screen_delays=None):
+        """
+        :param delay: seconds to wait after every message
+        :type delay: float
+        :param screen_delays: seconds to wait after a message of a screen, instead of delay
+        :type screen_delays: dict[ScreenType, float]
+        """
+        self.delay = delay
+        self.screen_delays = screen_delays or {}
+
+    def get_delay(self, game_state):
+        """Seconds to wait before the command answering a message
+
+        :param game_state: the game state of the message, None out of a game or on an error
+        :type game_state: Game
+        :return: the delay
+        :rtype: float
+        """
+        if game_state is not None:
+            return self.screen_delays.get(game_state.screen_type, self.delay)
+        return self.delay
+
+
+class BaseCoordinator(abc.ABC):
+    """The state of the communication with Slay the Spire and everything about it that doesn't depend on
+    how the messages are read and written, see Coordinator and AsyncCoordinator
+    """
+
+    # Seconds the loop waits for a message before it checks the game and the action queue again
+    message_timeout = 1.0
+
+    def __init__(self, pacing=None, decode=None):
+        """
+        :param pacing: when to wait before sending a command, no waiting by default
+        :type pacing: PacingPolicy
+        :param decode: the JSON decoder of the messages, the fastest installed by default, see decoder.get_decoder
+        :type decode: function(message: bytes) -> dict
+        """
         self.action_queue = collections.deque()
+        self.decode = decode if decode is not None else decoder.decode
         self.state_change_callback = None
         self.out_of_game_callback = None
         self.error_callback = None
@@ -69,6 +109,8 @@ class Coordinator:
         self.in_game = False
         self.last_game_state = None
         self.last_error = None
+        self.pacing = pacing if pacing is not None else PacingPolicy()
+        self.next_command_time = 0.0
 
     def signal_ready(self):
         """Indicate to Communication Mod that setup is complete
@@ -78,6 +120,7 @@ class Coordinator:
         """
         self.send_message("ready")
 
+    @abc.abstractmethod
     def send_message(self, message):
         """Send a command to Communication Mod and start waiting for a response
 
@@ -85,8 +128,6 @@ class Coordinator:
         :type message: str
         :return: None
         """
-        self.output_queue.put(message)
-        self.game_is_ready = False
 
     def add_action_to_queue(self, action):
         """Queue an action to perform when ready
@@ -113,13 +154,28 @@ class Coordinator:
         action.execute(self)
 
     def execute_next_action_if_ready(self):
-        """Immediately execute the next action in the action queue, if ready to do so
+        """Immediately execute the next action in the action queue, if ready to do so and the pacing delay is over
 
         :return: None
         """
-        if len(self.action_queue) > 0 and self.action_queue[0].can_be_executed(self):
+        if (
+            len(self.action_queue) > 0
+            and self.action_queue[0].can_be_executed(self)
+            and time.monotonic() >= self.next_command_time
+        ):
             self.execute_next_action()
 
+    def get_wait_time(self):
+        """How long to wait for the next message: until the pacing delay is over when the next action
+        only waits for it, else message_timeout
+
+        :return: the time in seconds
+        :rtype: float
+        """
+        if len(self.action_queue) > 0 and self.action_queue[0].can_be_executed(self):
+            return max(0.0, self.next_command_time - time.monotonic())
+        return self.message_timeout
+
     def register_state_change_callback(self, new_callback):
         """Register a function to be called when a message is received from Communication Mod
 
@@ -147,53 +203,147 @@ class Coordinator:
         """
         self.out_of_game_callback = new_callback
 
-    def get_next_raw_message(self, block=False):
-        """Get the next message from Communication Mod as a string
+    def update_game_state(self, message):
+        """Update the stored game state with a message from Communication Mod
+
+        :param message: the message from Communication Mod
+        :type message: bytes
+        :return: None
+        """
+        communication_state = self.decode(message)
+        self.last_error = communication_state.get("error", None)
+        self.game_is_ready = communication_state.get("ready_for_command")
+        if self.last_error is None:
+            self.in_game = communication_state.get("in_game")
+            if self.in_game:
+                self.last_game_state = Game.from_json(
+                    communication_state.get("game_state"),
+                    communication_state.get("available_commands"),
+                )
+        paced_state = self.last_game_state
+        if self.last_error is not None or not self.in_game:
+            paced_state = None
+        self.next_command_time = time.monotonic() + self.pacing.get_delay(paced_state)
+
+    def get_callback(self):
+        """The callback answering the last message and its arguments, None if no action is needed.
+        An error clears the action queue, so does the end of a run with stop_after_run
+
+        :return: the callback and the tuple of its arguments, or None
+        :rtype: tuple
+        """
+        if self.last_error is not None:
+            self.action_queue.clear()
+            return self.error_callback, (self.last_error,)
+        if self.in_game:
+            if len(self.action_queue) == 0:
+                return self.state_change_callback, (self.last_game_state,)
+            return None
+        if self.stop_after_run:
+            self.clear_actions()
+            return None
+        return self.out_of_game_callback, ()
+
+    def is_victory(self):
+        """Whether the game that just ended was won
+
+        :return: True if the game was a victory, else False
+        :rtype: bool
+        """
+        if self.last_game_state.screen_type == ScreenType.GAME_OVER:
+            return self.last_game_state.screen.victory
+        else:
+            return False
+
+
+class Coordinator(BaseCoordinator):
+    """An object to coordinate communication with Slay the Spire"""
+
+    def __init__(self, pacing=None, decode=None):
+        """
+        :param pacing: when to wait before sending a command, no waiting by default
+        :type pacing: PacingPolicy
+        :param decode: the JSON decoder of the messages, the fastest installed by default, see decoder.get_decoder
+        :type decode: function(message: bytes) -> dict
+        """
+        super().__init__(pacing, decode)
+        file_path = "output.txt"
+        self.input_queue = queue.Queue()
+        self.output_queue = queue.Queue()
+        self.input_thread = threading.Thread(
+            target=read_stdin, args=(self.input_queue, file_path)
+        )
+        self.output_thread = threading.Thread(
+            target=write_stdout, args=(self.output_queue,)
+        )
+        self.input_thread.daemon = True
+        self.input_thread.start()
+        self.output_thread.daemon = True
+        self.output_thread.start()
+
+    def send_message(self, message):
+        """Send a command to Communication Mod and start waiting for a response
+
+        :param message: the message to send
+        :type message: str
+        :return: None
+        """
+        self.output_queue.put(message)
+        self.game_is_ready = False
+
+    def handle_next_event(self, perform_callbacks=True):
+        """Execute the next action if it is ready, then wait for the next message, until the next action
+        can be executed at the latest, and handle it
+
+        :param perform_callbacks: set to True to perform callbacks based on the new game state
+        :type perform_callbacks: bool
+        :return: whether a message was received
+        """
+        self.execute_next_action_if_ready()
+        wait_time = self.get_wait_time()
+        return self.receive_game_state_update(
+            block=wait_time > 0, perform_callbacks=perform_callbacks, timeout=wait_time
+        )
+
+    def get_next_raw_message(self, block=False, timeout=None):
+        """Get the next message from Communication Mod as bytes
 
         :param block: set to True to wait for the next message
         :type block: bool
-        :return: the message from Communication Mod
-        :rtype: str
+        :param timeout: when blocking, the most seconds to wait, None to wait forever
+        :type timeout: float
+        :return: the message from Communication Mod, None if there is none
+        :rtype: bytes
         """
-        if block or not self.input_queue.empty():
+        if block:
+            try:
+                return self.input_queue.get(timeout=timeout)
+            except queue.Empty:
+                return None
+        if not self.input_queue.empty():
             return self.input_queue.get()
 
-    def receive_game_state_update(self, block=False, perform_callbacks=True):
+    def receive_game_state_update(
+        self, block=False, perform_callbacks=True, timeout=None
+    ):
         """Using the next message from Communication Mod, update the stored game state
 
         :param block: set to True to wait for the next message
         :type block: bool
         :param perform_callbacks: set to True to perform callbacks based on the new game state
         :type perform_callbacks: bool
+        :param timeout: when blocking, the most seconds to wait, None to wait forever
+        :type timeout: float
         :return: whether a message was received
         """
-        message = self.get_next_raw_message(block)
+        message = self.get_next_raw_message(block, timeout)
         if message is not None:
-            communication_state = json.loads(message)
-            self.last_error = communication_state.get("error", None)
-            self.game_is_ready = communication_state.get("ready_for_command")
-            if self.last_error is None:
-                self.in_game = communication_state.get("in_game")
-                if self.in_game:
-                    self.last_game_state = Game.from_json(
-                        communication_state.get("game_state"),
-                        communication_state.get("available_commands"),
-                    )
-            sleep(0.1)
+            self.update_game_state(message)
             if perform_callbacks:
-                if self.last_error is not None:
-                    self.action_queue.clear()
-                    new_action = self.error_callback(self.last_error)
-                    self.add_action_to_queue(new_action)
-                elif self.in_game:
-                    if len(self.action_queue) == 0 and perform_callbacks:
-                        new_action = self.state_change_callback(self.last_game_state)
-                        self.add_action_to_queue(new_action)
-                elif self.stop_after_run:
-                    self.clear_actions()
-                else:
-                    new_action = self.out_of_game_callback()
-                    self.add_action_to_queue(new_action)
+                callback = self.get_callback()
+                if callback is not None:
+                    new_callback, arguments = callback
+                    self.add_action_to_queue(new_callback(*arguments))
             return True
         return False
 
@@ -203,8 +353,7 @@ class Coordinator:
         :return: None
         """
         while True:
-            self.execute_next_action_if_ready()
-            self.receive_game_state_update(perform_callbacks=True)
+            self.handle_next_event(perform_callbacks=True)
 
             """
     :param player_class: the class to play
@@ -225,9 +374,5 @@ class Coordinator:
             StartGameAction(player_class, ascension_level, seed).execute(self)
             self.receive_game_state_update(block=True)
         while self.in_game:
-            self.execute_next_action_if_ready()
-            self.receive_game_state_update()
-        if self.last_game_state.screen_type == ScreenType.GAME_OVER:
-            return self.last_game_state.screen.victory
-        else:
-            return False
\ No newline at end of file
+            self.handle_next_event()
+        return self.is_victory()
\ No newline at end of file
@@ -0,0 +1,68 @@
+"""Decoding of the JSON messages of Communication Mod.
+
+A game state is tens of kilobytes of JSON and decoding it is most of the time the coordinator spends on a message, so the
+fastest library installed is used: orjson, ujson, msgspec, then the json module of the standard library. None of them is
+required. Every decoder takes the bytes of a message as well as a str, so the readers of the coordinators pass the lines on
+without decoding them to text first.
+"""
+
+import json
+
+backends = ("orjson", "ujson", "msgspec", "json")
+
+
+def load_backend(name):
+    """The decode function of a backend
+
+    :param name: one of backends
+    :type name: str
+    :return: a function from the bytes or str of a message to its object
+    :raises ImportError: if the library of the backend isn't installed
+    """
+    if name == "orjson":
+        import orjson
+
+        return orjson.loads
+    if name == "ujson":
+        import ujson
+
+        return ujson.loads
+    if name == "msgspec":
+        import msgspec
+
+        return msgspec.json.decode
+    if name == "json":
+        return json.loads
+    raise ValueError(f"Unknown JSON backend {name}, expected one of {backends}")
+
+
+def get_available_backends():
+    """The names of the backends whose library is installed, fastest first
+
+    :return: the names
+    :rtype: list[str]
+    """
+    available = []
+    for name in backends:
+        try:
+            load_backend(name)
+        except ImportError:
+            continue
+        available.append(name)
+    return available
+
+
+def get_decoder(name=None):
+    """The decode function of a backend, the fastest installed one by default
+
+    :param name: the backend to use, one of backends
+    :type name: str
+    :return: a function from the bytes or str of a message to its object
+    """
+    if name is not None:
+        return load_backend(name)
+    return load_backend(get_available_backends()[0])
+
+
+backend = get_available_backends()[0]
+decode = load_backend(backend)
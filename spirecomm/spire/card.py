@@ -1,5 +1,8 @@
 from enum import Enum
 
+from card_dictionary import get_card_spec
+from spirecomm.spire.slots import Slotted
+
 
 class CardType(Enum):
     ATTACK = 1
@@ -18,7 +21,23 @@ class CardRarity(Enum):
     CURSE = 6
 
 
-class Card:
+class Card(Slotted):
+    __slots__ = (
+        "card_id",
+        "name",
+        "type",
+        "rarity",
+        "upgrades",
+        "has_target",
+        "cost",
+        "uuid",
+        "misc",
+        "price",
+        "is_playable",
+        "exhausts",
+        "spec",
+    )
+
     def __init__(
         self,
         card_id,
@@ -46,6 +65,8 @@ class Card:
         self.price = price
         self.is_playable = is_playable
         self.exhausts = exhausts
+        # The values of the card dictionary, resolved once here so the simulation doesn't look them up by name
+        self.spec = get_card_spec(name, upgrades)
 
     def __repr__(self):
         return self.name
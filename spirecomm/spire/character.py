@@ -1,5 +1,6 @@
 from enum import Enum
 from spirecomm.spire.power import Power
+from spirecomm.spire.undo import Journaled, record_list
 
 
 class Intent(Enum):
@@ -54,9 +55,36 @@ class Orb:
         return orb
 
 
-class Character:
+def index_powers(powers):
+    """The powers by power_id, in the order of the list. An id can appear more than once when add_buff adds a power by a name that isn't its id"""
+    index = {}
+    for power in powers:
+        index[power.power_id] = index.get(power.power_id, ()) + (power,)
+    return index
+
+
+class Character(Journaled):
+    __slots__ = (
+        "max_hp",
+        "current_hp",
+        "block",
+        "power_list",
+        "power_index",
+        "totals",
+        "eval_terms",
+        "powers_hash",
+    )
+
+    # The fields evaluate_state and the state hash read, their changes and the changes of the power amounts are reported to totals
+    watched_fields = frozenset(
+        ["current_hp", "max_hp", "block", "powers", "power_index"]
+    )
 
     def __init__(self, max_hp, current_hp=None, block=0):
+        # The RunningTotals of a search and the terms and hash of the powers this character last added to them, see spirecomm.ai.running_totals
+        self.totals = None
+        self.eval_terms = None
+        self.powers_hash = None
         self.max_hp = max_hp
         self.current_hp = current_hp
         if self.current_hp is None:
@@ -64,8 +92,70 @@ class Character:
         self.block = block
         self.powers = []
 
+    @property
+    def powers(self):
+        return self.power_list
+
+    @powers.setter
+    def powers(self, powers):
+        # The assignment of powers is journaled, rolling it back comes through here again and rebuilds the index
+        object.__setattr__(self, "power_list", powers)
+        object.__setattr__(self, "power_index", index_powers(powers))
+        for power in powers:
+            object.__setattr__(power, "owner", self)
+
+    def watched_field_changed(self, name, old_value):
+        if self.totals is not None:
+            if name == "powers" or name == "power_index":
+                self.totals.powers_changed(self)
+            else:
+                self.totals.field_changed(self, name, old_value)
+
+    def powers_changed(self):
+        """The amount of one of the powers changed"""
+        if self.totals is not None:
+            self.totals.powers_changed(self)
+
+    def get_power(self, power_id):
+        """The first power with this id or None"""
+        powers = self.power_index.get(power_id)
+        return powers[0] if powers else None
+
+    def power_amount(self, power_id):
+        """The total amount of the powers with this id, 0 without any"""
+        powers = self.power_index.get(power_id)
+        if not powers:
+            return 0
+        if len(powers) == 1:
+            return powers[0].amount
+        return sum(power.amount for power in powers)
+
+    def append_power(self, power):
+        object.__setattr__(power, "owner", self)
+        record_list(self.power_list)
+        self.power_list.append(power)
+        index = dict(self.power_index)
+        index[power.power_id] = index.get(power.power_id, ()) + (power,)
+        self.power_index = index
+
+    def remove_power(self, power):
+        record_list(self.power_list)
+        self.power_list.remove(power)
+        self.power_index = index_powers(self.power_list)
+
 
 class Player(Character):
+    __slots__ = (
+        "energy",
+        "hand",
+        "draw_pile",
+        "discard_pile",
+        "exhaust_pile",
+        "ethereal",
+        "orbs",
+    )
+
+    watched_fields = Character.watched_fields | {"energy"}
 
     def __init__(self, max_hp, current_hp=None, block=0, energy=0):
         super().__init__(max_hp, current_hp, block)
@@ -98,6 +188,8 @@ class Player(Character):
                 self.draw_pile = self.discard_pile[:]
                 self.discard_pile = []
             if self.draw_pile:
+                record_list(self.hand)
+                record_list(self.draw_pile)
                 self.hand.append(self.draw_pile.pop(0))
 
     def shuffle_discard_into_draw(self):
@@ -119,13 +211,12 @@ class Player(Character):
             found_buff.amount += amount
         else:
             new_buff = Power(power_id=buff_name, name=buff_name, amount=amount)
-            self.powers.append(new_buff)
+            self.append_power(new_buff)
     
     def has_debuff(self, name):
         for buff in self.powers:
             if buff.power_name == name:
                 return True
-            break
 
         return False
 
@@ -137,6 +228,23 @@ class Buff:
 
 
 class Monster(Character):
+    __slots__ = (
+        "name",
+        "monster_id",
+        "intent",
+        "half_dead",
+        "is_gone",
+        "move_id",
+        "last_move_id",
+        "second_last_move_id",
+        "move_base_damage",
+        "move_adjusted_damage",
+        "move_hits",
+        "monster_index",
+    )
+
+    watched_fields = Character.watched_fields | {"is_gone", "move_adjusted_damage"}
+
     def __init__(
         self,
         name,
@@ -215,7 +323,7 @@ class Monster(Character):
             found_buff.amount += amount
         else:
             new_buff = Power(power_id=buff_name, name=buff_name, amount=amount)
-            self.powers.append(new_buff)
+            self.append_power(new_buff)
 
     def remove_buff(self, buff_name, amount):
         found_buff = next(
@@ -224,13 +332,12 @@ class Monster(Character):
         if found_buff:
             found_buff.amount -= amount
         if found_buff.amount <= 0:
-            self.powers.remove(found_buff)
+            self.remove_power(found_buff)
 
     def has_debuff(self, name):
         for buff in self.powers:
             if buff.power_name == name:
                 return True
-            break
 
         return False
 
@@ -1,3 +1,5 @@
+import copy
+import pickle
 from enum import Enum
 import spirecomm.spire.relic
 import spirecomm.spire.card
@@ -5,6 +7,8 @@ import spirecomm.spire.character
 import spirecomm.spire.map
 import spirecomm.spire.potion
 import spirecomm.spire.screen
+import spirecomm.spire.undo
+from spirecomm.spire.undo import Journaled
 
 
 class RoomPhase(Enum):
@@ -14,9 +18,122 @@ class RoomPhase(Enum):
     INCOMPLETE = 4
 
 
-class Game:
+def build_cards(json_cards):
+    return [spirecomm.spire.card.Card.from_json(json_card) for json_card in json_cards]
+
+
+def build_relics(game, json_state):
+    return [
+        spirecomm.spire.relic.Relic.from_json(json_relic)
+        for json_relic in json_state.get("relics", [])
+    ]
+
+
+def build_deck(game, json_state):
+    return build_cards(json_state.get("deck", []))
+
+
+def build_map(game, json_state):
+    return spirecomm.spire.map.Map.from_json(json_state.get("map", []))
+
+
+def build_potions(game, json_state):
+    return [
+        spirecomm.spire.potion.Potion.from_json(potion)
+        for potion in json_state.get("potions", [])
+    ]
+
+
+def build_screen(game, json_state):
+    return spirecomm.spire.screen.screen_from_json(
+        game.screen_type, json_state.get("screen_state", {})
+    )
+
+
+def build_player(game, json_state):
+    if not game.in_combat:
+        return None
+    return spirecomm.spire.character.Player.from_json(
+        json_state.get("combat_state", {}).get("player", {})
+    )
+
+
+def build_monsters(game, json_state):
+    if not game.in_combat:
+        return []
+    monsters = [
+        spirecomm.spire.character.Monster.from_json(json_monster)
+        for json_monster in json_state.get("combat_state", {}).get("monsters", [])
+    ]
+    for i, monster in enumerate(monsters):
+        monster.monster_index = i
+    return monsters
+
+
+def pile_builder(pile):
+    def build_pile(game, json_state):
+        if not game.in_combat:
+            return []
+        return build_cards(json_state.get("combat_state", {}).get(pile, []))
+
+    return build_pile
+
+
+def build_card_in_play(game, json_state):
+    if not game.in_combat:
+        return None
+    card_in_play = json_state.get("combat_state", {}).get("card_in_play", None)
+    if card_in_play:
+        card_in_play = spirecomm.spire.card.Card.from_json(card_in_play)
+    return card_in_play
+
+
+class LazySection:
+    """A section of a LazyGame, built from the message the first time it is read.
+    The built value is stored in the __dict__ of the game, which hides this descriptor from then on
+    """
+
+    def __init__(self, build):
+        self.build = build
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, game, owner=None):
+        if game is None:
+            return self
+        value = game.build_section(self)
+        game.become_game_if_built()
+        return value
+
+
+class Game(Journaled):
+    # The parts of the state a combat simulation changes, clone_for_simulation copies them and shares everything else
+    combat_sections = (
+        "player",
+        "monsters",
+        "draw_pile",
+        "discard_pile",
+        "exhaust_pile",
+        "hand",
+        "limbo",
+        "card_in_play",
+        "played_cards",
+        "running_totals",
+    )
+    # The parts only read during a simulation
+    shared_sections = ("relics", "deck", "potions", "map", "screen", "choice_list")
+
+    # The damage counters of the turn are part of the state hash, see spirecomm.ai.running_totals
+    watched_fields = frozenset(
+        ["damage_dealt", "instances_of_damage", "cards_drawn_this_turn"]
+    )
 
     def __init__(self):
+        # Terms of evaluate_state and the state hash the simulation keeps up to date, None until a search starts them,
+        # see spirecomm.ai.running_totals
+        self.running_totals = None
+
         # General state
         self.current_action = None
         self.current_hp = 0
@@ -48,6 +165,8 @@ class Game:
         self.turn = 0
         self.cards_discarded_this_turn = 0
         self.cards_drawn_this_turn = 0
+        # Relic and monster flags of the fight, see spirecomm.ai.combat_context
+        self.combat_context = None
 
         # Current Screen
         self.screen = None
@@ -67,7 +186,13 @@ class Game:
 
     @classmethod
     def from_json(cls, json_state, available_commands):
-        game = cls()
+        """The game state of a message, as a LazyGame. Only the plain fields are read here, the sections in
+        LazyGame.lazy_sections are built the first time they are read, the same as if they had been built here
+        """
+        game = LazyGame()
+        for name in LazyGame.lazy_sections:
+            del game.__dict__[name]
+        game.json_state = json_state
         game.current_action = json_state.get("current_action", None)
         game.current_hp = json_state.get("current_hp", 0)
         game.max_hp = json_state.get("max_hp", 0)
@@ -79,19 +204,6 @@ class Game:
             json_state.get("class", "IRONCLAD")
         ]
         game.ascension_level = json_state.get("ascension_level", 0)
-        game.relics = [
-            spirecomm.spire.relic.Relic.from_json(json_relic)
-            for json_relic in json_state.get("relics", [])
-        ]
-        game.deck = [
-            spirecomm.spire.card.Card.from_json(json_card)
-            for json_card in json_state.get("deck", [])
-        ]
-        game.map = spirecomm.spire.map.Map.from_json(json_state.get("map", []))
-        game.potions = [
-            spirecomm.spire.potion.Potion.from_json(potion)
-            for potion in json_state.get("potions", [])
-        ]
         game.act_boss = json_state.get("act_boss", None)
         game.played_cards = []
 
@@ -100,9 +212,6 @@ class Game:
         game.screen_type = spirecomm.spire.screen.ScreenType[
             json_state.get("screen_type")
         ]
-        game.screen = spirecomm.spire.screen.screen_from_json(
-            game.screen_type, json_state.get("screen_state", {})
-        )
         game.room_phase = RoomPhase[json_state.get("room_phase", "COMBAT")]
         game.room_type = json_state.get("room_type", "Unknown")
         game.choice_available = "choice_list" in json_state
@@ -113,40 +222,6 @@ class Game:
         game.in_combat = game.room_phase == RoomPhase.COMBAT
         if game.in_combat:
             combat_state = json_state.get("combat_state", {})
-            game.player = spirecomm.spire.character.Player.from_json(
-                combat_state.get("player", {})
-            )
-            game.monsters = [
-                spirecomm.spire.character.Monster.from_json(json_monster)
-                for json_monster in combat_state.get("monsters", [])
-            ]
-            for i, monster in enumerate(game.monsters):
-                monster.monster_index = i
-            game.draw_pile = [
-                spirecomm.spire.card.Card.from_json(json_card)
-                for json_card in combat_state.get("draw_pile", [])
-            ]
-            game.discard_pile = [
-                spirecomm.spire.card.Card.from_json(json_card)
-                for json_card in combat_state.get("discard_pile", [])
-            ]
-            game.exhaust_pile = [
-                spirecomm.spire.card.Card.from_json(json_card)
-                for json_card in combat_state.get("exhaust_pile", [])
-            ]
-            game.hand = [
-                spirecomm.spire.card.Card.from_json(json_card)
-                for json_card in combat_state.get("hand", [])
-            ]
-            game.limbo = [
-                spirecomm.spire.card.Card.from_json(json_card)
-                for json_card in combat_state.get("limbo", [])
-            ]
-            game.card_in_play = combat_state.get("card_in_play", None)
-            if game.card_in_play:
-                game.card_in_play = spirecomm.spire.card.Card.from_json(
-                    game.card_in_play
-                )
             game.turn = combat_state.get("turn", 0)
             game.cards_discarded_this_turn = combat_state.get(
                 "cards_discarded_this_turn", 0
@@ -166,6 +241,29 @@ class Game:
 
         return game
 
+    def load_sections(self):
+        """Builds the sections of from_json not read yet, every section of a Game is built, see LazyGame"""
+        pass
+
+    def watched_field_changed(self, name, old_value):
+        if self.running_totals is not None:
+            self.running_totals.turn_field_changed(self, name, old_value)
+
+    def clone_for_simulation(self, check_shared=False):
+        """A copy of the state for simulate_card_play, only the combat sections are copied and the rest is shared with this state.
+        With check_shared a fingerprint of the shared sections is kept so SimGame.assert_shared_unchanged can verify nothing changed them
+        """
+        self.load_sections()
+        clone = SimGame.__new__(SimGame)
+        clone.__dict__.update(self.__dict__)
+        memo = {}
+        for name in self.combat_sections:
+            if name in self.__dict__:
+                clone.__dict__[name] = copy.deepcopy(self.__dict__[name], memo)
+        if check_shared:
+            clone.shared_fingerprints = clone.get_shared_fingerprints()
+        return clone
+
     def are_potions_full(self):
         for potion in self.potions:
             if potion.potion_id == "Potion Slot":
@@ -195,4 +293,83 @@ class Game:
                 "Block Potion"
             ]:
                 potions.append(potion)
-        return potions
\ No newline at end of file
+        return potions
+
+
+class LazyGame(Game):
+    """A game made by Game.from_json, some of its sections aren't built yet. Once they all are, by a read each or by
+    load_sections, the game drops the message and becomes a plain Game: the interpreter reads an attribute slower when
+    the class has one of the same name, like the LazySection descriptors, and the search reads the sections all the time
+    """
+
+    # Most messages only need a few fields of the game, json_state keeps the message until every section is built
+    relics = LazySection(build_relics)
+    deck = LazySection(build_deck)
+    map = LazySection(build_map)
+    potions = LazySection(build_potions)
+    screen = LazySection(build_screen)
+    player = LazySection(build_player)
+    monsters = LazySection(build_monsters)
+    draw_pile = LazySection(pile_builder("draw_pile"))
+    discard_pile = LazySection(pile_builder("discard_pile"))
+    exhaust_pile = LazySection(pile_builder("exhaust_pile"))
+    hand = LazySection(pile_builder("hand"))
+    limbo = LazySection(pile_builder("limbo"))
+    card_in_play = LazySection(build_card_in_play)
+    lazy_sections = tuple(
+        name for name, value in vars().items() if isinstance(value, LazySection)
+    )
+
+    def build_section(self, section):
+        """Builds a section from the message and stores it in the game"""
+        # Building a section isn't a change of the state, the writes of the new objects are kept out of the
+        # UndoLog recording, an undo would delete their attributes
+        recording_log = spirecomm.spire.undo.active_log
+        spirecomm.spire.undo.active_log = None
+        try:
+            value = section.build(self, self.json_state)
+        finally:
+            spirecomm.spire.undo.active_log = recording_log
+        object.__setattr__(self, section.name, value)
+        return value
+
+    def become_game_if_built(self):
+        """Drops the message and turns this game into a Game once every section is built"""
+        if all(name in self.__dict__ for name in self.lazy_sections):
+            del self.__dict__["json_state"]
+            object.__setattr__(self, "__class__", Game)
+
+    def load_sections(self):
+        """Builds the sections not read yet and turns this game into a Game"""
+        for name in self.lazy_sections:
+            if name not in self.__dict__:
+                self.build_section(getattr(LazyGame, name))
+        self.become_game_if_built()
+
+    def __reduce_ex__(self, protocol):
+        # Pickled as the Game it becomes, the workers of the search pool don't get the message
+        self.load_sections()
+        return Game.__reduce_ex__(self, protocol)
+
+
+class SimGame(Game):
+    """A game state made by Game.clone_for_simulation, the sections in Game.shared_sections belong to the state it was cloned from"""
+
+    shared_fingerprints = None
+
+    def get_shared_fingerprints(self):
+        return {
+            name: pickle.dumps(self.__dict__.get(name))
+            for name in self.shared_sections
+        }
+
+    def assert_shared_unchanged(self):
+        """Raises an AssertionError naming the shared sections changed since the state was cloned with check_shared"""
+        if self.shared_fingerprints is None:
+            return
+        changed = [
+            name
+            for name, fingerprint in self.get_shared_fingerprints().items()
+            if fingerprint != self.shared_fingerprints[name]
+        ]
+        assert not changed, f"Shared sections changed during the simulation: {changed}"
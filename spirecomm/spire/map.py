@@ -1,4 +1,8 @@
-class Node:
+from spirecomm.spire.slots import Slotted
+
+
+class Node(Slotted):
+    __slots__ = ("x", "y", "symbol", "children")
 
     def __init__(self, x, y, symbol):
         self.x = x
@@ -1,4 +1,15 @@
-class Potion:
+from spirecomm.spire.slots import Slotted
+
+
+class Potion(Slotted):
+    __slots__ = (
+        "potion_id",
+        "name",
+        "can_use",
+        "can_discard",
+        "requires_target",
+        "price",
+    )
 
     def __init__(self, potion_id, name, can_use, can_discard, requires_target, price=0):
         self.potion_id = potion_id
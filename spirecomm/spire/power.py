@@ -1,9 +1,25 @@
 import spirecomm.spire.card
+from spirecomm.spire.undo import Journaled
 
 
-class Power:
+class Power(Journaled):
+    __slots__ = (
+        "power_id",
+        "power_name",
+        "amount",
+        "damage",
+        "misc",
+        "just_applied",
+        "card",
+        "owner",
+    )
+
+    # The character the power belongs to hears about the changes of its amount, see spirecomm.ai.running_totals
+    watched_fields = frozenset(["amount"])
 
     def __init__(self, power_id, name, amount, damage=0, misc=0, just_applied=False, card=None):
+        # Set by the character the power is given to
+        self.owner = None
         self.power_id = power_id
         self.power_name = name
         self.amount = amount
@@ -25,5 +41,9 @@ class Power:
             card = spirecomm.spire.card.Card.from_json(card)
         return cls(power_id, name, amount, damage, misc, just_applied, card)
 
+    def watched_field_changed(self, name, old_value):
+        if self.owner is not None:
+            self.owner.powers_changed()
+
     def __eq__(self, other):
         return self.power_id == other.power_id and self.amount == other.amount
@@ -1,4 +1,8 @@
-class Relic:
+from spirecomm.spire.slots import Slotted
+
+
+class Relic(Slotted):
+    __slots__ = ("relic_id", "name", "counter", "price")
 
     def __init__(self, relic_id, name, counter=0, price=0):
         self.relic_id = relic_id
@@ -0,0 +1,53 @@
+from copy import deepcopy
+
+_MISSING = object()
+
+slot_names = {}
+
+
+def get_slot_names(cls):
+    """Every slot of cls and of its bases, computed once per class"""
+    names = slot_names.get(cls)
+    if names is None:
+        names = tuple(
+            name
+            for klass in reversed(cls.__mro__)
+            for name in klass.__dict__.get("__slots__", ())
+            if name not in ("__dict__", "__weakref__")
+        )
+        slot_names[cls] = names
+    return names
+
+
+class Slotted:
+    """Base class of the models with __slots__. copy.deepcopy and pickle of a slotted object go through copyreg and set every slot with setattr,
+    these copy the slots directly which is faster than the copy of a __dict__ object and skips the hooks of Journaled.__setattr__
+    """
+
+    __slots__ = ()
+
+    def __deepcopy__(self, memo):
+        cls = type(self)
+        clone = cls.__new__(cls)
+        memo[id(self)] = clone
+        for name in get_slot_names(cls):
+            value = getattr(self, name, _MISSING)
+            if value is not _MISSING:
+                object.__setattr__(clone, name, deepcopy(value, memo))
+        if hasattr(self, "__dict__"):
+            clone.__dict__.update(deepcopy(self.__dict__, memo))
+        return clone
+
+    def __getstate__(self):
+        state = {}
+        for name in get_slot_names(type(self)):
+            value = getattr(self, name, _MISSING)
+            if value is not _MISSING:
+                state[name] = value
+        if hasattr(self, "__dict__"):
+            state.update(self.__dict__)
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
@@ -0,0 +1,77 @@
+from spirecomm.spire.slots import Slotted
+
+_MISSING = object()
+_LIST = object()
+
+active_log = None
+
+
+class Journaled(Slotted):
+    """Base class of every object the simulation changes. While an UndoLog is recording, the old value of every attribute write is logged.
+    A write to one of the watched_fields calls watched_field_changed with the name and the old value, an undo restores the values without calling it
+    """
+
+    __slots__ = ()
+
+    watched_fields = frozenset()
+
+    def __setattr__(self, name, value):
+        if active_log is not None:
+            active_log.entries.append((self, name, getattr(self, name, _MISSING)))
+        if name in self.watched_fields:
+            old_value = getattr(self, name, None)
+            object.__setattr__(self, name, value)
+            if value != old_value:
+                self.watched_field_changed(name, old_value)
+        else:
+            object.__setattr__(self, name, value)
+
+    def watched_field_changed(self, name, old_value):
+        pass
+
+
+def record_list(values):
+    """Must be called before a list is changed in place (append, remove, pop, clear...) so its content can be restored"""
+    if active_log is not None:
+        active_log.entries.append((values, _LIST, values[:]))
+
+
+class UndoLog:
+    """Records the changes made to the simulated objects so they can be rolled back in O(changes) instead of copying the whole game state
+
+    Usage:
+        with UndoLog() as log:
+            mark = log.mark()
+            ... change the state ...
+            log.undo(mark)
+    """
+
+    def __init__(self):
+        self.entries = []
+
+    def __enter__(self):
+        global active_log
+        self.previous_log = active_log
+        active_log = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global active_log
+        active_log = self.previous_log
+        return False
+
+    def mark(self):
+        """The position to roll back to"""
+        return len(self.entries)
+
+    def undo(self, mark):
+        """Rolls back every change recorded after the mark, newest first"""
+        entries = self.entries
+        while len(entries) > mark:
+            obj, name, old_value = entries.pop()
+            if name is _LIST:
+                obj[:] = old_value
+            elif old_value is _MISSING:
+                object.__delattr__(obj, name)
+            else:
+                object.__setattr__(obj, name, old_value)